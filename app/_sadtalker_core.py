@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+
+# Shared by run_pipeline.py and the optimized pipeline so both use one code path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SADTALKER_DIR = os.path.join(PROJECT_ROOT, "SadTalker")
+
+# The one PYTORCH_CUDA_ALLOC_CONF default for every entry point; read when torch initializes CUDA.
+# Expandable segments keep long sessions with varying tensor shapes from fragmenting the allocator
+CUDA_ALLOC_CONF = "expandable_segments:True"
+
+def configure_cuda_allocator():
+    """Apply CUDA_ALLOC_CONF unless the user set PYTORCH_CUDA_ALLOC_CONF; call before the first CUDA allocation"""
+    os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", CUDA_ALLOC_CONF)
+
+def run_tts(text: str, out_path: str) -> str:
+    """Generate speech for text in-process with Google TTS and write it to out_path"""
+    from app.generate_audio_gtts import synthesize
+
+    return synthesize(text, out_path)
+
+def sadtalker_env() -> dict:
+    """Environment for SadTalker child processes: lazy CUDA kernel loading and a shared Inductor cache"""
+    # The parent environment is kept (CUDA paths, proxies for model downloads); only these are added
+    env = dict(os.environ)
+    env.setdefault("CUDA_MODULE_LOADING", "LAZY")
+    env.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(PROJECT_ROOT, ".cache", "torch_compile"))
+    return env
+
+def sadtalker_command(audio_path: str, image_path: str, result_dir: str, *, size: int = None,
+                      preprocess: str = "crop", enhancer: str = None, still: bool = True,
+                      cpu: bool = False) -> list:
+    """Build the SadTalker inference.py command line (paths relative to the SadTalker dir)"""
+    command = [
+        sys.executable, "inference.py",
+        "--driven_audio", audio_path,
+        "--source_image", image_path,
+        "--result_dir", result_dir,
+    ]
+    if still:
+        command.append("--still")
+    command += ["--preprocess", preprocess]
+    if enhancer:
+        command += ["--enhancer", enhancer]
+    if size:
+        command += ["--size", str(size)]
+    if cpu:
+        command.append("--cpu")
+    return command
+
+def latest_video(result_dir: str):
+    """Newest .mp4 SadTalker wrote directly into result_dir, or None"""
+    if not os.path.isdir(result_dir):
+        return None
+    with os.scandir(result_dir) as it:
+        videos = [entry for entry in it if entry.is_file() and entry.name.endswith('.mp4')]
+    if not videos:
+        return None
+    return max(videos, key=lambda entry: entry.stat().st_mtime).path
+
+def run_sadtalker(audio_path: str, image_path: str, result_dir: str, *, size: int = None,
+                  preprocess: str = "crop", enhancer: str = None, still: bool = True,
+                  cpu: bool = False):
+    """Run SadTalker as a subprocess and return the video it wrote to result_dir"""
+    os.makedirs(os.path.join(SADTALKER_DIR, result_dir), exist_ok=True)
+    command = sadtalker_command(audio_path, image_path, result_dir, size=size, preprocess=preprocess,
+                                enhancer=enhancer, still=still, cpu=cpu)
+    subprocess.run(command, cwd=SADTALKER_DIR, env=sadtalker_env(), check=True)
+    return latest_video(os.path.join(SADTALKER_DIR, result_dir))
@@ -1,41 +1,72 @@
 import argparse
 import os
+import sys
+from io import BytesIO
+import numpy as np
 from gtts import gTTS
 from pydub import AudioSegment
 
+def synthesize_to_memory(text: str, log=print):
+    """Generate 16 kHz mono speech in memory, returning (WAV bytes, float32 waveform)"""
+    # Generate audio using gTTS (outputs MP3)
+    log(f"Generating audio for text: '{text}'")
+    tts = gTTS(text=text, lang='en', slow=False)
+
+    buf = BytesIO()
+    tts.write_to_fp(buf)
+    buf.seek(0)
+
+    # SadTalker resamples to 16 kHz mono anyway, so decode at that rate directly
+    audio = AudioSegment.from_file(buf, format="mp3").set_frame_rate(16000).set_channels(1)
+
+    wav_buf = BytesIO()
+    audio.export(wav_buf, format="wav")
+
+    # Same scaling as librosa.load: float32 in [-1, 1]
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    waveform = samples / float(1 << (8 * audio.sample_width - 1))
+    return wav_buf.getvalue(), waveform
+
+def synthesize(text: str, output: str) -> str:
+    """Generate speech for text with Google TTS and write it to output (WAV, MP3 or '-' for stdout)"""
+    # Keep stdout clean for the WAV stream when writing to '-'
+    log = print if output != '-' else (lambda *args: print(*args, file=sys.stderr))
+
+    if output == '-':
+        wav_bytes, _ = synthesize_to_memory(text, log)
+        sys.stdout.buffer.write(wav_bytes)
+        sys.stdout.buffer.flush()
+        return output
+
+    # Create output directory if it doesn't exist
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    # Convert MP3 to WAV in memory if output is WAV format
+    if output.endswith('.wav'):
+        wav_bytes, _ = synthesize_to_memory(text, log)
+        with open(output, 'wb') as f:
+            f.write(wav_bytes)
+    else:
+        # MP3 output needs no conversion
+        log(f"Generating audio for text: '{text}'")
+        gTTS(text=text, lang='en', slow=False).save(output)
+
+    log(f"Audio generated: {output}")
+    return output
+
 def main():
     parser = argparse.ArgumentParser(description='Generate audio using Google TTS')
     parser.add_argument('--text', required=True, help='Text to convert to speech')
-    parser.add_argument('--output', required=True, help='Output audio file path')
-    
+    parser.add_argument('--output', required=True, help="Output audio file path ('-' writes WAV to stdout)")
+
     args = parser.parse_args()
-    
+
     # Debug print to verify text is received correctly
-    print(f"DEBUG: Received text: '{args.text}'")
-    print(f"DEBUG: Output path: '{args.output}'")
-    
-    # Create output directory if it doesn't exist
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
-    
-    # Generate audio using gTTS (outputs MP3)
-    print(f"Generating audio for text: '{args.text}'")
-    tts = gTTS(text=args.text, lang='en', slow=False)
-    
-    # Save as temporary MP3 file first
-    temp_mp3 = args.output.replace('.wav', '_temp.mp3')
-    tts.save(temp_mp3)
-    
-    # Convert MP3 to WAV if output is WAV format
-    if args.output.endswith('.wav'):
-        print("Converting MP3 to WAV format...")
-        audio = AudioSegment.from_mp3(temp_mp3)
-        audio.export(args.output, format="wav")
-        os.remove(temp_mp3)  # Clean up temp file
-    else:
-        # Just rename the MP3 file
-        os.rename(temp_mp3, args.output)
-    
-    print(f"Audio generated: {args.output}")
+    debug_out = sys.stderr if args.output == '-' else sys.stdout
+    print(f"DEBUG: Received text: '{args.text}'", file=debug_out)
+    print(f"DEBUG: Output path: '{args.output}'", file=debug_out)
+
+    synthesize(args.text, args.output)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,51 @@
+import argparse
+import functools
+import os
+import wave
+
+# Default voice model, overridable with PIPER_MODEL
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODEL = os.environ.get(
+    "PIPER_MODEL", os.path.join(PROJECT_ROOT, "models", "piper", "en_US-amy-medium.onnx")
+)
+
+@functools.lru_cache(maxsize=None)
+def load_voice(model_path: str = DEFAULT_MODEL, use_cuda: bool = False):
+    """Load a Piper voice once per (model_path, use_cuda) and keep it resident for later calls"""
+    from piper import PiperVoice
+
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Piper voice model not found: {model_path}")
+    print(f"Loading Piper voice: {os.path.basename(model_path)}")
+    return PiperVoice.load(model_path, use_cuda=use_cuda)
+
+def synthesize(text: str, output: str, model_path: str = DEFAULT_MODEL, use_cuda: bool = False) -> str:
+    """Generate speech for text locally with Piper and write it to output as WAV"""
+    # Create output directory if it doesn't exist
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    voice = load_voice(model_path, use_cuda)
+    print(f"Generating audio for text: '{text}'")
+
+    with wave.open(output, "wb") as wav_file:
+        # piper-tts >= 1.3 renamed the WAV writer to synthesize_wav
+        if hasattr(voice, "synthesize_wav"):
+            voice.synthesize_wav(text, wav_file)
+        else:
+            voice.synthesize(text, wav_file)
+
+    print(f"Audio generated: {output}")
+    return output
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate audio using Piper TTS')
+    parser.add_argument('--text', required=True, help='Text to convert to speech')
+    parser.add_argument('--output', required=True, help='Output WAV file path')
+    parser.add_argument('--model', default=DEFAULT_MODEL, help='Piper .onnx voice model')
+
+    args = parser.parse_args()
+
+    synthesize(args.text, args.output, model_path=args.model)
+
+if __name__ == "__main__":
+    main()
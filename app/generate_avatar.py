@@ -1,26 +1,116 @@
-from diffusers import StableDiffusionPipeline
+from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
 import torch
 import os
 
-# Create directory for images if it doesn't exist
-os.makedirs("app/images", exist_ok=True)
+def quantize_unet_int8(unet):
+    """Swap UNet Linear layers (outside attention) for bitsandbytes INT8 layers; call while the UNet is on CPU"""
+    import bitsandbytes as bnb
 
-# Check if MPS (Metal Performance Shaders) is available for Mac
-if torch.backends.mps.is_available():
-    device = "mps"
-    print("Using MPS (Metal) acceleration")
-else:
-    device = "cpu"
+    # Attention projections stay FP16 to keep attention numerics intact; matched on the
+    # qualified name, since to_out is a ModuleList whose Linear child is named "0"
+    attention_layers = ("to_q", "to_k", "to_v", "to_out")
+    replaced = 0
+    for parent_name, parent in list(unet.named_modules()):
+        for name, child in list(parent.named_children()):
+            qualified_name = f"{parent_name}.{name}" if parent_name else name
+            if not isinstance(child, torch.nn.Linear) or any(
+                part in attention_layers for part in qualified_name.split(".")
+            ):
+                continue
+            int8_linear = bnb.nn.Linear8bitLt(
+                child.in_features, child.out_features, bias=child.bias is not None,
+                has_fp16_weights=False, threshold=6.0
+            )
+            int8_linear.weight = bnb.nn.Int8Params(child.weight.data, requires_grad=False, has_fp16_weights=False)
+            if child.bias is not None:
+                int8_linear.bias = torch.nn.Parameter(child.bias.data, requires_grad=False)
+            setattr(parent, name, int8_linear)
+            replaced += 1
+
+    # Int8Params quantize on their CPU -> CUDA move, so this must be the UNet's first move to CUDA
+    unet.to("cuda")
+    return replaced
+
+DEFAULT_PROMPT = "Professional Indian Man, Front-facing, smiling, clean background, photo-realistic"
+
+# Loaded Stable Diffusion pipeline, kept for later calls in the same process
+_PIPE = None
+
+def _get_device() -> str:
+    """Prefer CUDA, then MPS (Metal Performance Shaders) on Mac"""
+    if torch.cuda.is_available():
+        print("Using CUDA acceleration")
+        return "cuda"
+    if torch.backends.mps.is_available():
+        print("Using MPS (Metal) acceleration")
+        return "mps"
     print("Using CPU for inference")
+    return "cpu"
+
+def _load_pipeline():
+    """Load Stable Diffusion once with the fast settings"""
+    global _PIPE
+    if _PIPE is not None:
+        return _PIPE
+
+    device = _get_device()
+
+    # FP16 weights on GPU backends; CPU has no fast half-precision kernels
+    use_fp16 = device in ("cuda", "mps")
+
+    # Load the model with appropriate settings; the safety checker's CLIP classifier is skipped
+    pipe = StableDiffusionPipeline.from_pretrained(
+        "runwayml/stable-diffusion-v1-5",
+        torch_dtype=torch.float16 if use_fp16 else torch.float32,
+        variant="fp16" if use_fp16 else None,
+        safety_checker=None
+    )
+
+    # DPM-Solver++ reaches comparable quality in 20 steps
+    pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
+
+    # INT8 UNet linear layers on CUDA (bitsandbytes is optional); built while the UNet is
+    # still on CPU, since the weights are quantized when they move to the GPU
+    if device == "cuda":
+        try:
+            replaced = quantize_unet_int8(pipe.unet)
+            print(f"Quantized {replaced} UNet linear layers to INT8")
+        except ImportError:
+            print("bitsandbytes not installed, keeping FP16 UNet")
+
+    pipe = pipe.to(device)
+
+    # Memory-efficient attention: xformers on CUDA, attention slicing as the fallback (e.g. MPS)
+    try:
+        pipe.enable_xformers_memory_efficient_attention()
+        print("Using xformers memory-efficient attention")
+    except (ModuleNotFoundError, ValueError):
+        pipe.enable_attention_slicing("auto")
+        print("xformers unavailable, using attention slicing")
+
+    # Channels-last lets cuDNN pick NHWC convolution kernels for the UNet
+    pipe.unet.to(memory_format=torch.channels_last)
+
+    _PIPE = pipe
+    return _PIPE
+
+def ensure_avatar(path: str = "app/images/avatar.jpg", prompt: str = DEFAULT_PROMPT) -> str:
+    """Return the avatar image path, generating it only if it does not exist yet"""
+    if os.path.exists(path):
+        print(f"Avatar already exists: {path}")
+        return path
+
+    # Create directory for images if it doesn't exist
+    os.makedirs(os.path.dirname(path), exist_ok=True)
 
-# Load the model with appropriate settings for Mac
-pipe = StableDiffusionPipeline.from_pretrained(
-    "runwayml/stable-diffusion-v1-5"
-).to(device)
+    pipe = _load_pipeline()
+    print(f"Generating image with prompt: '{prompt}'")
+    with torch.inference_mode():
+        image = pipe(prompt, num_inference_steps=20, guidance_scale=7.0, height=512, width=512).images[0]
 
-prompt = "Professional Indian Man, Front-facing, smiling, clean background, photo-realistic"
-print(f"Generating image with prompt: '{prompt}'")
-image = pipe(prompt, num_inference_steps=30, height=512, width=512).images[0]
+    image.save(path)
+    print(f"Avatar image saved to {path}")
+    return path
 
-image.save("app/images/avatar.jpg")
-print("Avatar image saved to app/images/avatar.jpg")
\ No newline at end of file
+if __name__ == "__main__":
+    ensure_avatar()
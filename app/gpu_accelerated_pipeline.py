@@ -1,13 +1,17 @@
 import os
-import subprocess
-import sys
-import shlex
 import time
+import shutil
 import asyncio
-import glob
+import functools
+import itertools
 import torch
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict
+from collections import deque
+from typing import Dict, Optional
+
+from app._sadtalker_core import configure_cuda_allocator
+from app import generate_audio_piper
+from app.generate_audio_gtts import synthesize as synthesize_gtts
+from app.sadtalker_runner import SadTalkerRunner
 
 class GPUAcceleratedAvatarPipeline:
     """
@@ -20,8 +24,12 @@ class GPUAcceleratedAvatarPipeline:
     - Parallel processing
     - Maintains full SadTalker animation quality
     """
+
+    # Generated audio files and per-request video dirs, oldest first (shared across instances)
+    audio_artifacts = deque()
+    video_artifacts = deque()
     
-    def __init__(self, keep_files: int = 3, enable_gpu: bool = True):
+    def __init__(self, keep_files: int = 3, enable_gpu: bool = True, use_piper: bool = True, use_trt: bool = True):
         print("🚀 Initializing GPU-Accelerated Avatar Pipeline...")
         
         # Setup paths
@@ -34,18 +42,39 @@ class GPUAcceleratedAvatarPipeline:
         self.enable_gpu = enable_gpu
         self.keep_files = keep_files
         
+        # Request ids for collision-free audio names and per-request video result dirs
+        self._seq = itertools.count()
+        
         # Create directories
         os.makedirs(self.audio_dir, exist_ok=True)
         os.makedirs(self.video_dir, exist_ok=True)
         
-        # Thread pool for async operations
-        self.executor = ThreadPoolExecutor(max_workers=2)  # Increased for parallel ops
-        
         # Initialize GPU settings
         self._setup_gpu_environment()
         
-        # Clean up old files
-        self._cleanup_old_files()
+        # Local Piper TTS (no network round-trip), with gTTS as the fallback
+        self.synthesize = synthesize_gtts
+        self.tts_backend = "gTTS"
+        if use_piper:
+            try:
+                use_cuda = self.enable_gpu and self.device == "cuda"
+                generate_audio_piper.load_voice(generate_audio_piper.DEFAULT_MODEL, use_cuda)
+                self.synthesize = functools.partial(generate_audio_piper.synthesize, use_cuda=use_cuda)
+                self.tts_backend = "Piper"
+            except (ImportError, FileNotFoundError) as e:
+                print(f"   ⚠️ Piper TTS unavailable ({e}), falling back to gTTS")
+        print(f"   🎵 TTS backend: {self.tts_backend}")
+        
+        # Load SadTalker once and keep the models resident (SadTalker has no MPS path); with
+        # use_trt the face renderer runs from the TensorRT engine built by export_trt.py, if present
+        self.source_image = os.path.join(self.sadtalker_dir, "examples", "source_image", "art_3.png")
+        runner_device = "cuda" if self.enable_gpu and self.device == "cuda" else "cpu"
+        self.runner = SadTalkerRunner(self.sadtalker_dir, device=runner_device, preprocess="crop", enhancer="gfpgan",
+                                      use_trt=use_trt)
+        print(f"   🧮 Face renderer: {'TensorRT' if self.runner.trt_renderer is not None else 'PyTorch'}")
+
+        # Warm the 3DMM cache for the fixed source image
+        self.runner.preprocess_source(self.source_image)
         
         print("✅ GPU-Accelerated Avatar Pipeline initialized")
     
@@ -53,6 +82,9 @@ class GPUAcceleratedAvatarPipeline:
         """Setup GPU environment for optimal performance"""
         print("🔧 Setting up GPU environment...")
         
+        # CUDA allocator settings must be in place before the first CUDA allocation
+        configure_cuda_allocator()
+        
         # Check GPU availability
         if torch.cuda.is_available():
             self.device = "cuda"
@@ -70,92 +102,47 @@ class GPUAcceleratedAvatarPipeline:
             # Set environment variables for GPU optimization
             os.environ["PYTORCH_MPS_HIGH_WATERMARK_RATIO"] = "0.0"  # Optimize memory
             os.environ["PYTORCH_ENABLE_MPS_FALLBACK"] = "1"  # Fallback for unsupported ops
+            if self.device == "cuda":
+                torch.backends.cudnn.benchmark = True  # Fixed renderer shapes: pick the fastest algos
+                torch.backends.cudnn.allow_tf32 = True  # TF32 convolutions on Ampere+
+                torch.backends.cuda.matmul.allow_tf32 = True
+                torch.set_float32_matmul_precision("high")  # TF32 matmuls on Ampere+
             print(f"   🚀 GPU acceleration enabled: {self.device}")
         else:
             print(f"   💻 Using CPU mode")
     
     def _cleanup_old_files(self):
-        """Clean up old audio and video files, keeping only the most recent ones"""
-        print("🧹 Cleaning up old files...")
-        
-        # Clean audio files
-        audio_files = glob.glob(os.path.join(self.audio_dir, "*.wav"))
-        audio_files.extend(glob.glob(os.path.join(self.audio_dir, "*.mp3")))
-        
-        if len(audio_files) > self.keep_files:
-            audio_files.sort(key=os.path.getmtime, reverse=True)
-            files_to_remove = audio_files[self.keep_files:]
-            
-            for file_path in files_to_remove:
+        """Remove the oldest generated files beyond keep_files (no directory scans)"""
+        for artifacts in (self.audio_artifacts, self.video_artifacts):
+            while len(artifacts) > self.keep_files:
+                file_path = artifacts.popleft()
                 try:
-                    os.remove(file_path)
-                    print(f"   🗑️ Removed old audio: {os.path.basename(file_path)}")
+                    if os.path.isdir(file_path):
+                        shutil.rmtree(file_path)
+                    else:
+                        os.remove(file_path)
+                    print(f"   🗑️ Removed old file: {os.path.basename(file_path)}")
+                except FileNotFoundError:
+                    pass
                 except Exception as e:
                     print(f"   ⚠️ Could not remove {file_path}: {e}")
-        
-        # Clean video files and directories
-        video_items = []
-        
-        for file_path in glob.glob(os.path.join(self.video_dir, "*.mp4")):
-            video_items.append(('file', file_path, os.path.getmtime(file_path)))
-        
-        for item in os.listdir(self.video_dir):
-            item_path = os.path.join(self.video_dir, item)
-            if os.path.isdir(item_path) and item.replace('_', '').replace('.', '').isdigit():
-                video_items.append(('dir', item_path, os.path.getmtime(item_path)))
-        
-        if len(video_items) > self.keep_files:
-            video_items.sort(key=lambda x: x[2], reverse=True)
-            items_to_remove = video_items[self.keep_files:]
-            
-            for item_type, item_path, _ in items_to_remove:
-                try:
-                    if item_type == 'file':
-                        os.remove(item_path)
-                        print(f"   🗑️ Removed old video: {os.path.basename(item_path)}")
-                    elif item_type == 'dir':
-                        import shutil
-                        shutil.rmtree(item_path)
-                        print(f"   🗑️ Removed old video dir: {os.path.basename(item_path)}")
-                except Exception as e:
-                    print(f"   ⚠️ Could not remove {item_path}: {e}")
-        
-        print("✨ Cleanup completed")
     
     async def generate_voice_async(self, text: str) -> str:
-        """Generate audio using Google TTS (async, optimized)"""
+        """Generate audio using Piper or Google TTS (async, optimized)"""
         print(f"🎵 Starting optimized audio generation...")
         
-        # Generate unique filename with timestamp
-        timestamp = time.strftime("%Y_%m_%d_%H_%M_%S")
-        audio_filename = f"audio_{timestamp}.wav"
+        # Generate unique filename (safe for concurrent requests; its id also names the result dir)
+        audio_filename = f"audio_{os.getpid()}_{next(self._seq)}_{time.time_ns()}.wav"
         audio_path = os.path.join(self.audio_dir, audio_filename)
-        
-        # Run the gTTS script with absolute paths
-        script_path = os.path.join(self.project_root, "app", "generate_audio_gtts.py")
-        command = [
-            "python", script_path,
-            "--text", text,
-            "--output", audio_path
-        ]
+        # Tracked from creation so a failed request's partial file is evicted too
+        self.audio_artifacts.append(audio_path)
         
         print(f"   📝 Text length: {len(text)} characters")
         print(f"   📁 Output: {audio_filename}")
         
-        # Run in thread pool to make it async
-        loop = asyncio.get_event_loop()
-        
+        # Run TTS in-process (default executor keeps it non-blocking)
         try:
-            await loop.run_in_executor(
-                self.executor,
-                lambda: subprocess.run(
-                    command,
-                    check=True,
-                    cwd=self.project_root,
-                    capture_output=True,
-                    text=True
-                )
-            )
+            await asyncio.to_thread(self.synthesize, text, audio_path)
             
             # Verify file creation
             if os.path.exists(audio_path):
@@ -164,74 +151,56 @@ class GPUAcceleratedAvatarPipeline:
             else:
                 raise RuntimeError("Audio file not created")
                 
-        except subprocess.CalledProcessError as e:
-            print(f"   ❌ Audio generation failed: {e.stderr}")
+        except Exception as e:
+            print(f"   ❌ Audio generation failed: {e}")
             raise
         
         return f"app/audio/{audio_filename}"
     
-    async def generate_video_async(self, audio_filename: str) -> str:
+    async def generate_video_async(self, audio_filename: str, source_entry: dict = None) -> str:
         """Generate video using GPU-accelerated SadTalker"""
         print(f"🎬 Starting GPU-accelerated SadTalker...")
         
-        # Optimized SadTalker command for speed while maintaining quality
-        command = [
-            "python", "inference.py",
-            "--driven_audio", f"../{audio_filename}",
-            "--source_image", "examples/source_image/art_3.png",
-            "--result_dir", "../app/video",
-            "--still",  # Faster processing
-            "--preprocess", "crop",  # Faster than "full" but still good quality
-            "--enhancer", "gfpgan",  # Keep quality enhancement
-        ]
-        
         # Add GPU acceleration if available
-        if self.enable_gpu and self.device != "cpu":
-            # SadTalker will automatically use GPU if available
+        if self.runner.device == "cuda":
             print(f"   🚀 Using {self.device.upper()} acceleration")
         else:
-            command.extend(["--cpu"])  # Force CPU mode
             print(f"   💻 Using CPU mode")
         
         print(f"   🎯 Optimized for speed + quality balance")
-        print(f"   Running: {' '.join(command)}")
+        print(f"   Settings: still, preprocess=crop, enhancer=gfpgan (models already loaded)")
         
-        # Run in thread pool to make it async
-        loop = asyncio.get_event_loop()
+        # Per-request output directory, keyed by the audio file's unique id
+        request_id = os.path.splitext(os.path.basename(audio_filename))[0].replace("audio_", "", 1)
+        result_dir = os.path.join(self.video_dir, request_id)
+        self.video_artifacts.append(result_dir)
         
+        # Run in the default executor to make it async
         try:
-            result = await loop.run_in_executor(
-                self.executor,
-                lambda: subprocess.run(
-                    command, 
-                    cwd=self.sadtalker_dir, 
-                    check=True,
-                    capture_output=True,
-                    text=True
-                )
+            latest_video = await asyncio.to_thread(
+                self.runner.run,
+                os.path.join(self.project_root, audio_filename),
+                self.source_image,
+                result_dir,
+                still=True,  # Faster processing
+                enhancer="gfpgan",  # Keep quality enhancement
+                source_entry=source_entry,
             )
             
             print(f"   ✅ SadTalker completed successfully")
             
-            # Find the most recent video file
-            video_files = []
-            for root, dirs, files in os.walk(self.video_dir):
-                for file in files:
-                    if file.endswith('.mp4'):
-                        video_files.append(os.path.join(root, file))
-            
-            if video_files:
-                latest_video = max(video_files, key=os.path.getctime)
-                video_size = os.path.getsize(latest_video)
-                print(f"   📹 Generated video: {video_size:,} bytes")
-                return latest_video
-            else:
-                raise RuntimeError("No video file found after SadTalker generation")
+            video_size = os.path.getsize(latest_video)
+            print(f"   📹 Generated video: {video_size:,} bytes")
+            return latest_video
                 
-        except subprocess.CalledProcessError as e:
-            print(f"   ❌ SadTalker failed: {e.stderr}")
+        except Exception as e:
+            print(f"   ❌ SadTalker failed: {e}")
             raise
     
+    async def warmup(self):
+        """Run one silent clip through SadTalker (and GFPGAN) so timed requests start warm"""
+        await asyncio.to_thread(self.runner.warmup_full, self.source_image, enhancer="gfpgan")
+    
     async def generate_avatar_video(self, text: str) -> Dict[str, str]:
         """
         Main pipeline function - GPU-accelerated SadTalker with quality maintained
@@ -242,17 +211,19 @@ class GPUAcceleratedAvatarPipeline:
         print(f"🎯 Target: Daylily challenge (<2s) while maintaining SadTalker quality")
         
         try:
-            # Step 1: Generate audio (async, parallel ready)
-            print(f"\n🎵 Step 1: Audio generation...")
+            # Step 1: Generate audio while the source image is preprocessed
+            print(f"\n🎵 Step 1: Audio generation + source preprocessing...")
             audio_start = time.time()
-            audio_path = await self.generate_voice_async(text)
+            audio_task = asyncio.create_task(self.generate_voice_async(text))
+            prep_task = asyncio.to_thread(self.runner.preprocess_source, self.source_image)
+            audio_path, source_entry = await asyncio.gather(audio_task, prep_task)
             audio_time = time.time() - audio_start
             print(f"   ⏱️ Audio completed in {audio_time:.2f}s")
             
             # Step 2: Generate video (GPU-accelerated SadTalker)
             print(f"\n🎬 Step 2: GPU-accelerated video generation...")
             video_start = time.time()
-            video_path = await self.generate_video_async(audio_path)
+            video_path = await self.generate_video_async(audio_path, source_entry)
             video_time = time.time() - video_start
             print(f"   ⏱️ Video completed in {video_time:.2f}s")
             
@@ -288,9 +259,6 @@ class GPUAcceleratedAvatarPipeline:
             print(f"   🏆 Quality: {quality_check}")
             print(f"   🎯 Daylily status: {result['daylily_status']}")
             
-            # Clean up old files after successful generation
-            self._cleanup_old_files()
-            
             return result
             
         except Exception as e:
@@ -305,9 +273,22 @@ class GPUAcceleratedAvatarPipeline:
                 "backend": f"SadTalker GPU-Accelerated ({self.device.upper()})",
                 "daylily_status": "❌ FAILED"
             }
+        finally:
+            # Evict the oldest files, including those left by failed requests
+            self._cleanup_old_files()
+
+# Process-wide pipeline, so models, TTS voice and CUDA context are set up once
+_PIPELINE: Optional[GPUAcceleratedAvatarPipeline] = None
+
+def _get_pipeline(enable_gpu: bool = True, use_piper: bool = True) -> GPUAcceleratedAvatarPipeline:
+    """Return the shared pipeline, creating it on first use"""
+    global _PIPELINE
+    if _PIPELINE is None:
+        _PIPELINE = GPUAcceleratedAvatarPipeline(enable_gpu=enable_gpu, use_piper=use_piper)
+    return _PIPELINE
 
 # Convenience function for direct usage
-async def generate_talking_avatar_gpu(text: str, enable_gpu: bool = True) -> Dict[str, str]:
+async def generate_talking_avatar_gpu(text: str, enable_gpu: bool = True, use_piper: bool = True) -> Dict[str, str]:
     """
     Convenience function for GPU-accelerated high-quality talking avatars
     Maintains SadTalker quality while optimizing for Daylily challenge speed
@@ -315,9 +296,11 @@ async def generate_talking_avatar_gpu(text: str, enable_gpu: bool = True) -> Dic
     Args:
         text: Text to speak
         enable_gpu: Whether to use GPU acceleration
+        use_piper: Whether to use local Piper TTS (falls back to gTTS)
+        (both only take effect when the shared pipeline is first created)
     
     Returns:
         Dictionary with audio_path, video_path, performance metrics, and Daylily status
     """
-    pipeline = GPUAcceleratedAvatarPipeline(enable_gpu=enable_gpu)
+    pipeline = _get_pipeline(enable_gpu=enable_gpu, use_piper=use_piper)
     return await pipeline.generate_avatar_video(text)
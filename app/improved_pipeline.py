@@ -1,13 +1,16 @@
 import os
 import subprocess
 import sys
-import shlex
 import time
 import asyncio
-import glob
+import itertools
+import shutil
 from concurrent.futures import ThreadPoolExecutor
 from typing import Dict
 
+from app.generate_audio_gtts import synthesize
+from app._sadtalker_core import sadtalker_env, latest_video
+
 class ImprovedAvatarPipeline:
     """
     Improved Avatar Pipeline - Based on working original with minimal optimizations
@@ -39,6 +42,9 @@ class ImprovedAvatarPipeline:
         # Thread pool for async operations
         self.executor = ThreadPoolExecutor(max_workers=1)
         
+        # Request ids for collision-free audio names and per-request video result dirs
+        self._seq = itertools.count()
+        
         # Clean up old files on initialization
         self._cleanup_old_files()
         
@@ -48,14 +54,14 @@ class ImprovedAvatarPipeline:
         """Clean up old audio and video files, keeping only the most recent ones"""
         print("🧹 Cleaning up old files...")
         
-        # Clean audio files
-        audio_files = glob.glob(os.path.join(self.audio_dir, "*.wav"))
-        audio_files.extend(glob.glob(os.path.join(self.audio_dir, "*.mp3")))
+        # Clean audio files (scandir stats come from the directory read)
+        with os.scandir(self.audio_dir) as it:
+            audio_files = [(e.path, e.stat().st_mtime) for e in it if e.name.endswith(('.wav', '.mp3'))]
         
         if len(audio_files) > self.keep_files:
             # Sort by modification time (newest first)
-            audio_files.sort(key=os.path.getmtime, reverse=True)
-            files_to_remove = audio_files[self.keep_files:]
+            audio_files.sort(key=lambda x: x[1], reverse=True)
+            files_to_remove = [path for path, _ in audio_files[self.keep_files:]]
             
             for file_path in files_to_remove:
                 try:
@@ -67,15 +73,13 @@ class ImprovedAvatarPipeline:
         # Clean video files and directories
         video_items = []
         
-        # Get all .mp4 files
-        for file_path in glob.glob(os.path.join(self.video_dir, "*.mp4")):
-            video_items.append(('file', file_path, os.path.getmtime(file_path)))
-        
-        # Get all timestamp directories (e.g., 2025_07_31_20.11.27)
-        for item in os.listdir(self.video_dir):
-            item_path = os.path.join(self.video_dir, item)
-            if os.path.isdir(item_path) and item.replace('_', '').replace('.', '').isdigit():
-                video_items.append(('dir', item_path, os.path.getmtime(item_path)))
+        # Get all .mp4 files and per-request directories (e.g., 4242_0_1722456687123456789)
+        with os.scandir(self.video_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.mp4'):
+                    video_items.append(('file', entry.path, entry.stat().st_mtime))
+                elif entry.is_dir() and entry.name.replace('_', '').replace('.', '').isdigit():
+                    video_items.append(('dir', entry.path, entry.stat().st_mtime))
         
         if len(video_items) > self.keep_files:
             # Sort by modification time (newest first)
@@ -88,7 +92,6 @@ class ImprovedAvatarPipeline:
                         os.remove(item_path)
                         print(f"   🗑️ Removed old video: {os.path.basename(item_path)}")
                     elif item_type == 'dir':
-                        import shutil
                         shutil.rmtree(item_path)
                         print(f"   🗑️ Removed old video dir: {os.path.basename(item_path)}")
                 except Exception as e:
@@ -100,36 +103,18 @@ class ImprovedAvatarPipeline:
         """Generate audio using Google TTS (async version of original)"""
         print(f"🎵 Starting audio generation for text: '{text}'")
         
-        # Generate unique filename with timestamp
-        timestamp = time.strftime("%Y_%m_%d_%H_%M_%S")
-        audio_filename = f"audio_{timestamp}.wav"
+        # Generate unique filename (safe for concurrent requests; its id also names the result dir)
+        audio_filename = f"audio_{os.getpid()}_{next(self._seq)}_{time.time_ns()}.wav"
         audio_path = os.path.join(self.audio_dir, audio_filename)
         
         print(f"📁 Audio directory: {self.audio_dir}")
         print(f"📁 Audio file path: {audio_path}")
         
-        # Run the gTTS script with absolute paths
-        script_path = os.path.join(self.project_root, "app", "generate_audio_gtts.py")
-        command = [
-            "python", script_path,
-            "--text", text,
-            "--output", audio_path
-        ]
-        
-        print(f"Running command: {' '.join(shlex.quote(str(arg)) for arg in command)}")
-        
-        # Run in thread pool to make it async
+        # Run gTTS in-process (thread pool keeps it non-blocking)
         loop = asyncio.get_event_loop()
         
         try:
-            await loop.run_in_executor(
-                self.executor,
-                lambda: subprocess.run(
-                    command,
-                    check=True,
-                    cwd=self.project_root
-                )
-            )
+            await loop.run_in_executor(self.executor, synthesize, text, audio_path)
             
             # Check if new file was created
             if os.path.exists(audio_path):
@@ -142,8 +127,8 @@ class ImprovedAvatarPipeline:
                 
             print(f"✅ Audio generation completed!")
             
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Audio generation failed with return code {e.returncode}")
+        except Exception as e:
+            print(f"❌ Audio generation failed: {e}")
             raise
         
         # Return relative path for compatibility with SadTalker
@@ -153,12 +138,16 @@ class ImprovedAvatarPipeline:
         """Generate video using SadTalker (async version of original)"""
         print(f"🎬 Starting video generation using SadTalker...")
         
+        # Per-request output directory, keyed by the audio file's unique id
+        request_id = os.path.splitext(os.path.basename(audio_filename))[0].replace("audio_", "", 1)
+        result_dir = os.path.join(self.video_dir, request_id)
+        
         # Use the exact same command as the working original
         command = [
-            "python", "inference.py",
+            sys.executable, "inference.py",
             "--driven_audio", f"../{audio_filename}",
             "--source_image", "examples/source_image/art_3.png",  # Known working image
-            "--result_dir", "../app/video",
+            "--result_dir", result_dir,
             "--enhancer", "gfpgan",  # Same as original
             "--still",  # Same as original
             "--preprocess", "full"  # Same as original
@@ -172,23 +161,17 @@ class ImprovedAvatarPipeline:
         try:
             await loop.run_in_executor(
                 self.executor,
-                lambda: subprocess.run(command, cwd=self.sadtalker_dir, check=True)
+                lambda: subprocess.run(command, cwd=self.sadtalker_dir, env=sadtalker_env(), check=True)
             )
             
             print(f"✅ SadTalker video generation completed!")
             
-            # Find the most recent video file (same as original)
-            video_files = []
-            for root, dirs, files in os.walk(self.video_dir):
-                for file in files:
-                    if file.endswith('.mp4'):
-                        video_files.append(os.path.join(root, file))
+            # SadTalker writes a single <result_dir>/<time>.mp4 for this request
+            video_path = latest_video(result_dir)
             
-            if video_files:
-                # Return the most recently created video
-                latest_video = max(video_files, key=os.path.getctime)
-                print(f"📹 Found generated video: {latest_video}")
-                return latest_video
+            if video_path:
+                print(f"📹 Found generated video: {video_path}")
+                return video_path
             else:
                 raise RuntimeError("No video file found after SadTalker generation")
                 
@@ -0,0 +1,860 @@
+import os
+import sys
+import time
+import functools
+import itertools
+import shutil
+import hashlib
+import threading
+import subprocess
+import tempfile
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+import cv2
+import imageio
+import numpy as np
+import torch
+from tqdm import tqdm
+
+# Face enhancer checkpoints, as resolved by SadTalker's face_enhancer
+ENHANCER_MODELS = {
+    "gfpgan": ("clean", "GFPGANv1.4", "https://github.com/TencentARC/GFPGAN/releases/download/v1.3.0/GFPGANv1.4.pth"),
+    "RestoreFormer": ("RestoreFormer", "RestoreFormer", "https://github.com/TencentARC/GFPGAN/releases/download/v1.3.4/RestoreFormer.pth"),
+}
+
+# Low-latency GPU H.264 settings for imageio's ffmpeg writer
+NVENC_PARAMS = ["-preset", "p1", "-tune", "ll", "-rc", "vbr", "-cq", "28"]
+
+@functools.lru_cache(maxsize=1)
+def nvenc_available() -> bool:
+    """Whether imageio's ffmpeg build has the NVENC H.264 encoder"""
+    try:
+        import imageio_ffmpeg
+
+        encoders = subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-encoders"],
+            capture_output=True, text=True, check=True
+        ).stdout
+    except (ImportError, OSError, RuntimeError, subprocess.CalledProcessError):
+        return False
+    return "h264_nvenc" in encoders
+
+class NvencImageio:
+    """imageio stand-in for SadTalker's animate module: mimsave goes through the runner's encoder"""
+
+    def __init__(self, runner):
+        self.runner = runner
+
+    def mimsave(self, path, frames, fps=25.0, **kwargs):
+        self.runner._write_video(path, list(frames), fps=float(fps))
+
+    def __getattr__(self, name):
+        return getattr(imageio, name)
+
+class CUDAGraphRenderer:
+    """
+    Face renderer replayed from captured CUDA graphs
+
+    SadTalker renders a fixed-shape batch of frames per step, so the generator
+    forward is captured once per input shape and replayed for every later step,
+    removing the per-kernel launch overhead of the eager loop.
+    """
+
+    def __init__(self, generator, warmup_iters: int = 3):
+        self.generator = generator
+        self.warmup_iters = warmup_iters
+        self.graphs = {}  # input shape -> (graph, static inputs, static output)
+
+    def eager(self, source_image, kp_source, kp_driving):
+        """Plain generator forward on keypoint tensors"""
+        out = self.generator(source_image, kp_source={'value': kp_source}, kp_driving={'value': kp_driving})
+        return out['prediction']
+
+    def _capture(self, source_image, kp_source, kp_driving):
+        static_inputs = (source_image.clone(), kp_source.clone(), kp_driving.clone())
+
+        # Warm up on a side stream before capture, as CUDA graphs require
+        side_stream = torch.cuda.Stream()
+        side_stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(side_stream):
+            for _ in range(self.warmup_iters):
+                self.eager(*static_inputs)
+        torch.cuda.current_stream().wait_stream(side_stream)
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph):
+            static_output = self.eager(*static_inputs)
+        return graph, static_inputs, static_output
+
+    def __call__(self, source_image, kp_source, kp_driving):
+        key = (tuple(source_image.shape), tuple(kp_source.shape), tuple(kp_driving.shape), source_image.dtype)
+        if key not in self.graphs:
+            self.graphs[key] = self._capture(source_image, kp_source, kp_driving)
+
+        graph, static_inputs, static_output = self.graphs[key]
+        for static, value in zip(static_inputs, (source_image, kp_source, kp_driving)):
+            static.copy_(value)
+        graph.replay()
+        return static_output.clone()
+
+class TensorRTRenderer:
+    """
+    Face renderer executed from a serialized TensorRT engine
+
+    The engine is built offline by export_trt.py (ONNX export + trtexec --fp16).
+    Inputs and the output stay on the GPU as torch tensors and are bound to the
+    execution context by address, so no host staging is involved.
+    """
+
+    INPUTS = ("source_image", "kp_source", "kp_driving")
+
+    def __init__(self, engine_path: str):
+        import tensorrt as trt
+
+        self.logger = trt.Logger(trt.Logger.WARNING)
+        with open(engine_path, "rb") as f:
+            self.engine = trt.Runtime(self.logger).deserialize_cuda_engine(f.read())
+        if self.engine is None:
+            raise RuntimeError(f"Could not deserialize TensorRT engine: {engine_path}")
+        self.context = self.engine.create_execution_context()
+        self.outputs = {}  # output shape -> preallocated prediction buffer
+
+    def __call__(self, source_image, kp_source, kp_driving):
+        # The engine's I/O is FP32 NCHW; precision inside it was chosen at build time
+        inputs = [tensor.float().contiguous() for tensor in (source_image, kp_source, kp_driving)]
+        for name, tensor in zip(self.INPUTS, inputs):
+            self.context.set_input_shape(name, tuple(tensor.shape))
+            self.context.set_tensor_address(name, tensor.data_ptr())
+
+        shape = tuple(self.context.get_tensor_shape("prediction"))
+        output = self.outputs.get(shape)
+        if output is None:
+            output = self.outputs[shape] = torch.empty(shape, device=source_image.device)
+        self.context.set_tensor_address("prediction", output.data_ptr())
+
+        self.context.execute_async_v3(torch.cuda.current_stream().cuda_stream)
+        return output.clone()
+
+class SadTalkerRunner:
+    """
+    In-process SadTalker inference with models kept resident on the device
+
+    Mirrors SadTalker's inference.py, but the preprocessing, audio-to-coefficient
+    and face-render models are loaded once and reused for every request instead
+    of being reloaded by a fresh `python inference.py` process.
+    """
+
+    def __init__(self, sadtalker_dir: str, device: str = "cuda", size: int = 256,
+                 preprocess: str = "crop", old_version: bool = False, use_cuda_graph: bool = True,
+                 batch_size: int = 8, min_batch_size: int = 4, half: bool = True,
+                 amp_dtype: torch.dtype = torch.float16,
+                 enhance_every: int = 3, cache_dir: str = None, compile_models: bool = True,
+                 enhancer: str = None, channels_last: bool = True, trt_engine: str = None,
+                 use_trt: bool = True, batch_clips: int = 4):
+        print("🔧 Loading SadTalker models in-process...")
+        load_start = time.time()
+
+        self.sadtalker_dir = sadtalker_dir
+        self.device = device
+        self.size = size
+        self.preprocess = preprocess
+
+        # Source-image 3DMM coefficients, cached on disk and in memory per image hash
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.cache_dir = cache_dir or os.path.join(project_root, ".cache")
+        self.source_cache = {}
+        self.source_keys = {}  # (path, mtime_ns, size) -> content hash, so repeat calls skip the read
+
+        # Run the face enhancer on every Nth frame only; frames in between are flow-warped
+        self.enhance_every = max(1, enhance_every)
+        self.enhancers = {}
+
+        # Pinned host staging buffers (grown on demand) and a side stream for H2D copies;
+        # the lock serializes requests since buffers, cwd and graphs are shared
+        self.pinned_buffers = {}
+        self.copy_stream = torch.cuda.Stream() if device == "cuda" else None
+        self.lock = threading.RLock()
+
+        # Per-call working directories (and output .mp4 names) must never be shared
+        self._save_seq = itertools.count()
+
+        # Frames pre-rendered by run_batch, handed to AnimateFromCoeff for post-processing
+        self._rendered = None
+
+        # SadTalker writes its MP4 with imageio.mimsave; this routes it to NVENC when available
+        self._imageio = NvencImageio(self)
+
+        # Frames rendered per face-renderer step (lowered on CUDA OOM)
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        # Clips stacked per run_batch render pass; short groups are padded to it, so the batched
+        # renderer always sees batch_clips * batch_size rows (one static shape)
+        self.batch_clips = batch_clips
+
+        # torch.compile (reduce-overhead) fuses kernels and captures its own CUDA graphs
+        self.compile_models = compile_models and device == "cuda"
+
+        # SadTalker imports its own modules as `src.*`
+        if sadtalker_dir not in sys.path:
+            sys.path.insert(0, sadtalker_dir)
+
+        from src.utils.init_path import init_path
+        from src.utils.preprocess import CropAndExtract
+        from src.test_audio2coeff import Audio2Coeff
+        from src.facerender.animate import AnimateFromCoeff
+
+        with self._in_sadtalker_dir():
+            sadtalker_paths = init_path(
+                os.path.join(sadtalker_dir, "checkpoints"),
+                os.path.join(sadtalker_dir, "src", "config"),
+                size, old_version, preprocess
+            )
+            # Checkpoint loading releases the GIL, so the models (and the enhancer with
+            # its face detector) are constructed concurrently
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                preprocess_future = pool.submit(CropAndExtract, sadtalker_paths, device)
+                audio_future = pool.submit(Audio2Coeff, sadtalker_paths, device)
+                animate_future = pool.submit(AnimateFromCoeff, sadtalker_paths, device)
+                enhancer_future = pool.submit(self._get_enhancer, enhancer) if enhancer else None
+
+                self.preprocess_model = preprocess_future.result()
+                self.audio_to_coeff = audio_future.result()
+                self.animate_from_coeff = animate_future.result()
+                if enhancer_future is not None:
+                    enhancer_future.result()
+
+        # Pin weights on the target device in eval mode, with autograd off for good
+        for model in self._models():
+            model.to(device).eval().requires_grad_(False)
+
+        # FP16 (or BF16) renderer and mapping network (norm layers stay FP32 for stable statistics);
+        # only worth it with tensor cores (compute capability 7.0+)
+        self.half = half and device == "cuda" and torch.cuda.get_device_capability()[0] >= 7
+        self.amp_dtype = amp_dtype
+        if self.half:
+            for model in (self.animate_from_coeff.generator, self.animate_from_coeff.mapping):
+                model.to(amp_dtype)
+                for module in model.modules():
+                    if isinstance(module, torch.nn.modules.batchnorm._BatchNorm):
+                        module.float()
+
+        # NHWC convolutions map directly onto tensor-core kernels; the audio nets stay as they are
+        self.channels_last = channels_last and device == "cuda"
+        if self.channels_last:
+            self.animate_from_coeff.generator.to(memory_format=torch.channels_last)
+
+        # Prebuilt TensorRT engine for the renderer, when one exists for this size (INT8 preferred)
+        self.trt_renderer = None
+        trt_dir = os.path.join(project_root, "models", "trt")
+        engine_path = trt_engine or next(
+            (path for path in (os.path.join(trt_dir, f"face_render_{size}_int8.engine"),
+                               os.path.join(trt_dir, f"face_render_{size}.engine")) if os.path.isfile(path)),
+            ""
+        )
+        if use_trt and device == "cuda" and os.path.isfile(engine_path):
+            try:
+                self.trt_renderer = TensorRTRenderer(engine_path)
+                print(f"   ✅ TensorRT face renderer: {os.path.basename(engine_path)}")
+            except (ImportError, RuntimeError) as e:
+                print(f"   ⚠️ TensorRT renderer unavailable ({e}), using PyTorch")
+
+        if self.compile_models:
+            # Keep Inductor's compiled kernels next to the 3DMM cache so later processes skip the
+            # Triton compile, and let the remaining FP32 matmuls use TF32 tensor cores
+            os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(self.cache_dir, "torch_compile"))
+            torch.set_float32_matmul_precision("high")
+
+        # Render shapes are fixed (the last batch is padded), so compile static-shape graphs only
+        generator = self.animate_from_coeff.generator
+        if self.compile_models and self.trt_renderer is None:
+            generator = torch.compile(generator, mode="reduce-overhead", fullgraph=False, dynamic=False)
+        if self.compile_models:
+            self.animate_from_coeff.mapping = torch.compile(
+                self.animate_from_coeff.mapping, mode="reduce-overhead", fullgraph=False, dynamic=False
+            )
+
+            # Audio nets run on fixed 10-frame mel windows; their outputs are accumulated
+            # across calls, so they compile without CUDA graphs (which would overwrite them)
+            audio2exp = self.audio_to_coeff.audio2exp_model
+            audio2exp.netG = torch.compile(audio2exp.netG, fullgraph=False)
+            audio2pose = self.audio_to_coeff.audio2pose_model
+            audio2pose.audio_encoder = torch.compile(audio2pose.audio_encoder, fullgraph=False)
+
+        # Face renderer: CUDA graph replay on GPU, eager elsewhere
+        self.cuda_graph_renderer = CUDAGraphRenderer(generator)
+        self.use_cuda_graph = use_cuda_graph and device == "cuda" and not self.compile_models
+
+        if self.compile_models:
+            self.warmup()
+        
+        print(f"   ✅ SadTalker models loaded on {device.upper()} in {time.time() - load_start:.2f}s")
+
+    def warmup(self, iters: int = 2):
+        """Run the render stage on dummy inputs of the static batch shape (compilation / graph capture)"""
+        print("   🔥 Warming up renderer...")
+        warmup_start = time.time()
+
+        # AnimateFromCoeff feeds FP32 inputs; autocast handles the reduced precision
+        source_image = torch.zeros(self.batch_size, 3, self.size, self.size, device=self.device)
+        semantics = torch.zeros(self.batch_size, 70, 27, device=self.device)
+        kp = torch.zeros(self.batch_size, 15, 3, device=self.device)
+
+        # CUDA graphs and compiled renderers are shared with run(), so warm up under the render lock
+        with self.lock, torch.inference_mode(), self._autocast():
+            for _ in range(iters):
+                self.animate_from_coeff.mapping(semantics)
+                self._render_frames(source_image, kp, kp)
+            torch.cuda.synchronize()
+        print(f"   ✅ Renderer warm in {time.time() - warmup_start:.2f}s")
+
+    def warmup_full(self, source_image: str, seconds: float = 1.0, enhancer: str = None):
+        """Run one silent clip through the whole run() path (audio2coeff, renderer, encoder), discarding the output"""
+        print("   🔥 Warming up full SadTalker path...")
+        warmup_start = time.time()
+
+        warmup_dir = tempfile.mkdtemp(prefix="sadtalker_warmup_")
+        audio_path = os.path.join(warmup_dir, "silence.wav")
+        with wave.open(audio_path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(16000)
+            wav.writeframes(b"\0\0" * int(16000 * seconds))
+
+        try:
+            self.run(audio_path, source_image, warmup_dir, still=True, enhancer=enhancer)
+            if self.device == "cuda":
+                # Let cuDNN benchmarking and lazy kernel loading settle before anything is timed
+                torch.cuda.synchronize()
+        finally:
+            shutil.rmtree(warmup_dir, ignore_errors=True)
+        print(f"   ✅ SadTalker warm in {time.time() - warmup_start:.2f}s")
+
+    def _models(self) -> list:
+        """All torch modules owned by the runner"""
+        return [
+            self.preprocess_model.net_recon,
+            self.audio_to_coeff.audio2pose_model,
+            self.audio_to_coeff.audio2exp_model,
+            self.animate_from_coeff.generator,
+            self.animate_from_coeff.kp_extractor,
+            self.animate_from_coeff.he_estimator,
+            self.animate_from_coeff.mapping,
+        ]
+
+    @contextmanager
+    def _in_sadtalker_dir(self):
+        """SadTalker resolves configs and enhancer weights relative to its own directory"""
+        previous_cwd = os.getcwd()
+        os.chdir(self.sadtalker_dir)
+        try:
+            yield
+        finally:
+            os.chdir(previous_cwd)
+
+    def preprocess_source(self, source_image: str) -> dict:
+        """Crop the source image and extract its 3DMM coefficients, cached by image content hash"""
+        # Under the render lock: the fit's kernels must not run during CUDA graph capture,
+        # and the working-directory change is process-wide
+        with self.lock:
+            return self._preprocess_source(os.path.abspath(source_image))
+
+    def _preprocess_source(self, source_image: str) -> dict:
+        """preprocess_source body; the caller holds self.lock"""
+        st = os.stat(source_image)
+        stat_key = (source_image, st.st_mtime_ns, st.st_size)
+        key = self.source_keys.get(stat_key)
+        if key is None:
+            with open(source_image, "rb") as f:
+                key = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+            self.source_keys[stat_key] = key
+        if key in self.source_cache:
+            return self.source_cache[key]
+
+        cache_path = os.path.join(self.cache_dir, f"3dmm_{key}_{self.preprocess}_{self.size}.pt")
+        if os.path.exists(cache_path):
+            entry = torch.load(cache_path, map_location=self.device, weights_only=False)
+            print(f"   ⚡ Loaded cached 3DMM coefficients for {os.path.basename(source_image)}")
+        else:
+            work_dir = os.path.join(self.cache_dir, f"3dmm_{key}_tmp")
+            os.makedirs(work_dir, exist_ok=True)
+            try:
+                with torch.inference_mode(), self._in_sadtalker_dir():
+                    first_coeff_path, crop_pic_path, crop_info = self.preprocess_model.generate(
+                        source_image, work_dir, self.preprocess,
+                        source_image_flag=True, pic_size=self.size
+                    )
+                if first_coeff_path is None:
+                    raise RuntimeError(f"Could not extract 3DMM coefficients from {source_image}")
+
+                # Keep the raw files so they can be restored for SadTalker's path-based loaders
+                with open(first_coeff_path, "rb") as f:
+                    coeff_bytes = f.read()
+                with open(crop_pic_path, "rb") as f:
+                    crop_pic_bytes = f.read()
+                entry = {
+                    "coeff_name": os.path.basename(first_coeff_path),
+                    "coeff": coeff_bytes,
+                    "crop_pic_name": os.path.basename(crop_pic_path),
+                    "crop_pic": crop_pic_bytes,
+                    "crop_info": crop_info,
+                }
+                torch.save(entry, cache_path)
+                print(f"   💾 Cached 3DMM coefficients for {os.path.basename(source_image)}")
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        self.source_cache[key] = entry
+        return entry
+
+    @staticmethod
+    def _restore_source(entry: dict, first_frame_dir: str):
+        """Write cached preprocessing outputs into a request's working directory"""
+        first_coeff_path = os.path.join(first_frame_dir, entry["coeff_name"])
+        crop_pic_path = os.path.join(first_frame_dir, entry["crop_pic_name"])
+        with open(first_coeff_path, "wb") as f:
+            f.write(entry["coeff"])
+        with open(crop_pic_path, "wb") as f:
+            f.write(entry["crop_pic"])
+        return first_coeff_path, crop_pic_path, entry["crop_info"]
+
+    def _get_enhancer(self, method: str):
+        """Load a face enhancer once and reuse it across requests (cwd must be the SadTalker dir)"""
+        if method not in self.enhancers:
+            from gfpgan import GFPGANer
+
+            if method not in ENHANCER_MODELS:
+                raise ValueError(f"Unsupported enhancer: {method}")
+            arch, model_name, url = ENHANCER_MODELS[method]
+
+            model_path = os.path.join("gfpgan", "weights", model_name + ".pth")
+            if not os.path.isfile(model_path):
+                model_path = os.path.join("checkpoints", model_name + ".pth")
+            if not os.path.isfile(model_path):
+                model_path = url
+
+            restorer = GFPGANer(
+                model_path=model_path, upscale=2, arch=arch,
+                channel_multiplier=2, bg_upsampler=None
+            )
+            restorer.gfpgan.requires_grad_(False)
+            if self.compile_models:
+                restorer.gfpgan = torch.compile(restorer.gfpgan, mode="reduce-overhead", fullgraph=False)
+            self.enhancers[method] = restorer
+        return self.enhancers[method]
+
+    @staticmethod
+    def _warp_keyframe(key_enhanced, key_gray, gray):
+        """Warp an enhanced keyframe onto the current frame using dense optical flow"""
+        # Flow maps each pixel of the current frame to its position in the keyframe
+        flow = cv2.calcOpticalFlowFarneback(gray, key_gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+
+        # The enhancer upscales, so resize and rescale the flow field to match
+        height, width = key_enhanced.shape[:2]
+        scale_x = width / gray.shape[1]
+        scale_y = height / gray.shape[0]
+        flow = cv2.resize(flow, (width, height))
+
+        grid_x, grid_y = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+        map_x = grid_x + flow[..., 0] * scale_x
+        map_y = grid_y + flow[..., 1] * scale_y
+        return cv2.remap(key_enhanced, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    def _upload_faces(self, faces, slot: int):
+        """Start copying a chunk of uint8 face crops to the device on the copy stream"""
+        chunk = torch.from_numpy(faces)
+        if self.copy_stream is None:
+            return chunk.to(self.device), None
+
+        chunk = self._pin(f"enhance_{slot}", chunk)
+        with torch.cuda.stream(self.copy_stream):
+            chunk = chunk.to(self.device, non_blocking=True)
+            ready = torch.cuda.Event()
+            ready.record(self.copy_stream)
+        return chunk, ready
+
+    def enhance_batch(self, frames: list, method: str, batch: int = 16) -> list:
+        """Restore faces in BGR frames, batching the restoration network and overlapping uploads with compute"""
+        restorer = self._get_enhancer(method)
+        helper = restorer.face_helper
+
+        # Face detection and alignment stay per frame; remember where each frame's crops land
+        layouts, crops = [], []
+        for frame in frames:
+            helper.clean_all()
+            helper.read_image(frame)
+            helper.get_face_landmarks_5(only_center_face=False, eye_dist_threshold=5)
+            helper.align_warp_face()
+            layouts.append((len(crops), len(helper.cropped_faces), list(helper.affine_matrices)))
+            crops.extend(helper.cropped_faces)
+
+        restored = []
+        if crops:
+            crops = np.ascontiguousarray(np.stack(crops))
+            pending = self._upload_faces(crops[:batch], 0)
+            for start in range(0, len(crops), batch):
+                chunk, ready = pending
+                if ready is not None:
+                    torch.cuda.current_stream().wait_event(ready)
+                    chunk.record_stream(torch.cuda.current_stream())
+
+                # Queue the next chunk's copy while this one is restored
+                if start + batch < len(crops):
+                    pending = self._upload_faces(crops[start + batch:start + 2 * batch], (start // batch + 1) % 2)
+
+                # BGR uint8 NHWC -> RGB [-1, 1] NCHW, the same normalization GFPGANer.enhance applies
+                faces = chunk.flip(-1).permute(0, 3, 1, 2).float().div_(127.5).sub_(1.0)
+                with torch.inference_mode(), self._autocast():
+                    output = restorer.gfpgan(faces, return_rgb=False, weight=0.5)[0]
+                output = output.float().clamp_(-1.0, 1.0).add_(1.0).mul_(127.5).round_().to(torch.uint8)
+                restored.extend(output.flip(1).permute(0, 2, 3, 1).cpu().numpy())
+
+        # Paste restored faces back into each (upscaled) frame
+        enhanced = []
+        for frame, (offset, count, affine_matrices) in zip(frames, layouts):
+            helper.clean_all()
+            helper.read_image(frame)
+            helper.affine_matrices = affine_matrices
+            for face in restored[offset:offset + count]:
+                helper.add_restored_face(face)
+            helper.get_inverse_affine(None)
+            enhanced.append(helper.paste_faces_to_input_image(upsample_img=None))
+        return enhanced
+
+    def _enhance_video(self, video_path: str, method: str) -> str:
+        """Enhance keyframes of a rendered video and mux the original audio back in"""
+        frames = []
+        capture = cv2.VideoCapture(video_path)
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(frame)
+        capture.release()
+
+        # Restore all keyframes in batches, then warp them onto the frames in between
+        keyframes = iter(self.enhance_batch(frames[::self.enhance_every], method))
+
+        enhanced = []
+        key_enhanced = key_gray = None
+        for idx, frame in enumerate(tqdm(frames, 'Face Enhancer:')):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if idx % self.enhance_every == 0:
+                key_enhanced = next(keyframes)
+                key_gray = gray
+                enhanced.append(key_enhanced)
+            else:
+                enhanced.append(self._warp_keyframe(key_enhanced, key_gray, gray))
+
+        base_path = os.path.splitext(video_path)[0]
+        temp_path = base_path + "_enhanced_temp.mp4"
+        enhanced_path = base_path + "_enhanced.mp4"
+        self._write_video(temp_path, [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in enhanced], fps=float(25))
+
+        subprocess.run([
+            "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+            "-i", temp_path, "-i", video_path,
+            "-map", "0:v", "-map", "1:a", "-c", "copy", enhanced_path
+        ], check=True)
+        os.remove(temp_path)
+        return enhanced_path
+
+    def _write_video(self, path: str, frames: list, fps: float):
+        """Encode RGB frames to H.264, on the GPU (NVENC) when available"""
+        if self.device == "cuda" and nvenc_available():
+            try:
+                imageio.mimsave(path, frames, fps=fps, codec="h264_nvenc", ffmpeg_params=NVENC_PARAMS)
+                return
+            except (OSError, RuntimeError) as e:
+                # Listed encoders can still fail to open (driver too old, sessions exhausted)
+                print(f"   ⚠️ NVENC encode failed ({e}), using libx264")
+        imageio.mimsave(path, frames, fps=fps)
+
+    def _autocast(self):
+        """Mixed-precision autocast for the render stage when half precision is enabled"""
+        if self.half:
+            # No cast cache: cached casts must not be allocated inside CUDA graph capture
+            return torch.autocast(device_type="cuda", dtype=self.amp_dtype, cache_enabled=False)
+        return nullcontext()
+
+    def _pin(self, name: str, tensor):
+        """Copy a CPU tensor into a reusable pinned staging buffer"""
+        buffer = self.pinned_buffers.get(name)
+        if buffer is None or buffer.numel() < tensor.numel() or buffer.dtype != tensor.dtype:
+            buffer = torch.empty(tensor.numel(), dtype=tensor.dtype, pin_memory=True)
+            self.pinned_buffers[name] = buffer
+        staged = buffer[:tensor.numel()].view(tensor.shape)
+        staged.copy_(tensor)
+        return staged
+
+    def _stage(self, batch: dict, to_device: bool = False) -> dict:
+        """Move a batch's CPU tensors into pinned memory, optionally uploading them on the copy stream"""
+        if self.copy_stream is None:
+            return batch
+
+        staged = dict(batch)
+        with torch.cuda.stream(self.copy_stream):
+            for name, value in batch.items():
+                if torch.is_tensor(value) and value.device.type == "cpu":
+                    value = self._pin(name, value)
+                    staged[name] = value.to(self.device, non_blocking=True) if to_device else value
+        torch.cuda.current_stream().wait_stream(self.copy_stream)
+        if to_device:
+            # The pinned buffers are reused by the next batch, so the uploads must have finished reading them
+            self.copy_stream.synchronize()
+        return staged
+
+    def _render_group(self, group: list, source_image: str, enhancer: str) -> list:
+        """Render up to batch_clips prepared clips in one stacked pass and post-process each; caller holds self.lock"""
+        stacked = group + [group[-1]] * (self.batch_clips - len(group))
+
+        # Each clip is [batch_size, steps, ...]; pad steps with the last frame and stack the clips
+        lengths = [data["target_semantics_list"].shape[1] for _, _, data in stacked]
+        max_len = max(lengths)
+
+        def pad(target):
+            if target.shape[1] == max_len:
+                return target
+            tail = target[:, -1:].expand(-1, max_len - target.shape[1], *target.shape[2:])
+            return torch.cat([target, tail], dim=1)
+
+        source_images = torch.cat([data["source_image"] for _, _, data in stacked]).float().to(self.device)
+        source_semantics = torch.cat([data["source_semantics"] for _, _, data in stacked]).float().to(self.device)
+        target_semantics = torch.cat(
+            [pad(data["target_semantics_list"].float()) for _, _, data in stacked]
+        ).to(self.device)
+
+        with self._autocast():
+            predictions = self._make_animation(
+                source_images, source_semantics, target_semantics,
+                self.animate_from_coeff.generator, self.animate_from_coeff.kp_extractor,
+                self.animate_from_coeff.he_estimator, self.animate_from_coeff.mapping
+            )
+        del source_images, source_semantics, target_semantics
+
+        # SadTalker's own post-processing (resize, audio mux, paste-back) per real clip
+        video_paths = []
+        for idx, (save_dir, crop_info, data) in enumerate(group):
+            rows = slice(idx * self.batch_size, (idx + 1) * self.batch_size)
+            self._rendered = predictions[rows, :lengths[idx]].cpu()
+            result = self.animate_from_coeff.generate(
+                data, save_dir, source_image, crop_info, enhancer=None,
+                background_enhancer=None, preprocess=self.preprocess, img_size=self.size
+            )
+
+            if enhancer:
+                with self._autocast():
+                    result = self._enhance_video(result, enhancer)
+
+            video_path = save_dir + ".mp4"
+            shutil.move(result, video_path)
+            shutil.rmtree(save_dir, ignore_errors=True)
+            video_paths.append(video_path)
+        return video_paths
+
+    def _reset_renderer_state(self):
+        """Drop captured CUDA graphs and compiled graphs after an OOM, so the next call rebuilds them"""
+        self._rendered = None
+        self.cuda_graph_renderer.graphs.clear()
+        if self.compile_models:
+            # Also tears down Inductor's cudagraph trees and their memory pools; compiled
+            # modules recompile on their next call
+            torch._dynamo.reset()
+        torch.cuda.empty_cache()
+
+    def _render_frames(self, source_image, kp_source, kp_driving):
+        """Render one batch of frames for the given keypoints"""
+        if self.trt_renderer is not None:
+            return self.trt_renderer(source_image, kp_source, kp_driving)
+        if self.channels_last:
+            source_image = source_image.contiguous(memory_format=torch.channels_last)
+        if self.use_cuda_graph:
+            return self.cuda_graph_renderer(source_image, kp_source, kp_driving)
+        prediction = self.cuda_graph_renderer.eager(source_image, kp_source, kp_driving)
+        # Compiled outputs live in graph memory that the next replay overwrites
+        return prediction.clone() if self.compile_models else prediction
+
+    def _make_animation(self, source_image, source_semantics, target_semantics,
+                        generator, kp_detector, he_estimator, mapping,
+                        yaw_c_seq=None, pitch_c_seq=None, roll_c_seq=None,
+                        use_exp=True, use_half=False):
+        """Drop-in replacement for SadTalker's make_animation using the runner's renderer"""
+        from src.facerender.modules.make_animation import keypoint_transformation
+
+        # Clips already rendered by run_batch only need SadTalker's post-processing
+        if self._rendered is not None:
+            rendered, self._rendered = self._rendered, None
+            return rendered
+
+        predictions = []
+
+        kp_canonical = kp_detector(source_image)
+        he_source = mapping(source_semantics)
+        kp_source = keypoint_transformation(kp_canonical, he_source)
+
+        for frame_idx in tqdm(range(target_semantics.shape[1]), 'Face Renderer:'):
+            he_driving = mapping(target_semantics[:, frame_idx])
+            if yaw_c_seq is not None:
+                he_driving['yaw_in'] = yaw_c_seq[:, frame_idx]
+            if pitch_c_seq is not None:
+                he_driving['pitch_in'] = pitch_c_seq[:, frame_idx]
+            if roll_c_seq is not None:
+                he_driving['roll_in'] = roll_c_seq[:, frame_idx]
+
+            kp_driving = keypoint_transformation(kp_canonical, he_driving)
+            predictions.append(self._render_frames(source_image, kp_source['value'], kp_driving['value']))
+
+        return torch.stack(predictions, dim=1)
+
+    def _audio_to_coeff(self, first_coeff_path: str, audio_path: str, save_dir: str, still: bool,
+                        pose_style: int, audio_waveform=None) -> str:
+        """Audio to 3DMM coefficients; an in-memory 16 kHz waveform skips decoding the WAV again"""
+        from src.generate_batch import get_data
+        import src.utils.audio as audio_module
+
+        load_wav = audio_module.load_wav
+        if audio_waveform is not None:
+            audio_module.load_wav = lambda path, sr: audio_waveform
+        try:
+            # get_data builds the mel batch on CPU here; _stage uploads it from pinned memory
+            batch = self._stage(get_data(first_coeff_path, audio_path, "cpu", None, still=still), to_device=True)
+        finally:
+            audio_module.load_wav = load_wav
+        coeff_path = self.audio_to_coeff.generate(batch, save_dir, pose_style, None)
+        del batch
+        return coeff_path
+
+    def _new_save_dir(self, result_dir: str) -> str:
+        """Create a unique working directory in result_dir; its name also names the output .mp4"""
+        name = f"{time.strftime('%Y_%m_%d_%H.%M.%S')}_{os.getpid()}_{next(self._save_seq)}_{time.time_ns()}"
+        save_dir = os.path.join(result_dir, name)
+        # No exist_ok: a clash would mean two calls sharing one directory
+        os.makedirs(os.path.join(save_dir, "first_frame_dir"))
+        return save_dir
+
+    def run(self, audio_path: str, source_image: str, result_dir: str, still: bool = True,
+            enhancer: str = None, pose_style: int = 0, expression_scale: float = 1.0,
+            source_entry: dict = None, audio_waveform=None) -> str:
+        """Generate a talking-head video and return the path of the resulting .mp4"""
+        from src.generate_facerender_batch import get_facerender_data
+        import src.facerender.animate as animate_module
+
+        # Route AnimateFromCoeff's render loop (and its video encode) through this runner
+        animate_module.make_animation = self._make_animation
+        animate_module.imageio = self._imageio
+
+        # The working directory changes during inference, so resolve paths first
+        audio_path = os.path.abspath(audio_path)
+        source_image = os.path.abspath(source_image)
+        result_dir = os.path.abspath(result_dir)
+
+        with self.lock, torch.inference_mode(), self._in_sadtalker_dir():
+            save_dir = self._new_save_dir(result_dir)
+            first_frame_dir = os.path.join(save_dir, "first_frame_dir")
+
+            # Crop image and extract 3DMM coefficients (cached per source image)
+            first_coeff_path, crop_pic_path, crop_info = self._restore_source(
+                source_entry or self.preprocess_source(source_image), first_frame_dir
+            )
+
+            # Audio to coefficients
+            coeff_path = self._audio_to_coeff(first_coeff_path, audio_path, save_dir, still, pose_style, audio_waveform)
+
+            # Coefficients to video, retrying with a smaller renderer batch on OOM
+            while True:
+                data = get_facerender_data(
+                    coeff_path, crop_pic_path, first_coeff_path, audio_path, self.batch_size,
+                    None, None, None, expression_scale=expression_scale,
+                    still_mode=still, preprocess=self.preprocess, size=self.size
+                )
+                # AnimateFromCoeff casts on the host before uploading, so only pin here
+                data = self._stage(data)
+                try:
+                    with self._autocast():
+                        result = self.animate_from_coeff.generate(
+                            data, save_dir, source_image, crop_info, enhancer=None,
+                            background_enhancer=None, preprocess=self.preprocess, img_size=self.size
+                        )
+                    del data
+                    break
+                except torch.cuda.OutOfMemoryError:
+                    if self.batch_size <= self.min_batch_size:
+                        raise
+                    del data
+                    self._reset_renderer_state()
+                    self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+                    print(f"   ⚠️ CUDA OOM in face renderer, retrying with batch size {self.batch_size}")
+
+            # Face enhancement on a keyframe schedule instead of SadTalker's every-frame pass
+            if enhancer:
+                with self._autocast():
+                    result = self._enhance_video(result, enhancer)
+
+        video_path = save_dir + ".mp4"
+        shutil.move(result, video_path)
+        shutil.rmtree(save_dir, ignore_errors=True)
+        return video_path
+
+    def run_batch(self, jobs: list, source_image: str, still: bool = True, enhancer: str = None,
+                  pose_style: int = 0, expression_scale: float = 1.0, source_entry: dict = None) -> list:
+        """
+        Render several clips of the same source image in one batched face-renderer pass
+
+        Each job is a dict with audio_path, result_dir and optionally audio_waveform.
+        Returns the .mp4 path of every job, in order.
+        """
+        run_kwargs = dict(still=still, enhancer=enhancer, pose_style=pose_style,
+                          expression_scale=expression_scale, source_entry=source_entry)
+        if len(jobs) > 1:
+            try:
+                return self._run_batch(jobs, source_image, **run_kwargs)
+            except torch.cuda.OutOfMemoryError:
+                self._reset_renderer_state()
+                print(f"   ⚠️ CUDA OOM rendering {len(jobs)} clips together, rendering them one by one")
+
+        return [
+            self.run(job["audio_path"], source_image, job["result_dir"],
+                     audio_waveform=job.get("audio_waveform"), **run_kwargs)
+            for job in jobs
+        ]
+
+    def _run_batch(self, jobs: list, source_image: str, still: bool, enhancer: str,
+                   pose_style: int, expression_scale: float, source_entry: dict) -> list:
+        from src.generate_facerender_batch import get_facerender_data
+        import src.facerender.animate as animate_module
+
+        animate_module.make_animation = self._make_animation
+        animate_module.imageio = self._imageio
+        source_image = os.path.abspath(source_image)
+
+        clips = []
+        video_paths = []
+        with self.lock, torch.inference_mode(), self._in_sadtalker_dir():
+            entry = source_entry or self.preprocess_source(source_image)
+
+            # Per-clip preprocessing and audio-to-coefficients (cheap next to rendering)
+            for job in jobs:
+                audio_path = os.path.abspath(job["audio_path"])
+                # Jobs sharing a result_dir arrive in the same second by design, so each gets its own dir
+                save_dir = self._new_save_dir(os.path.abspath(job["result_dir"]))
+                first_frame_dir = os.path.join(save_dir, "first_frame_dir")
+
+                first_coeff_path, crop_pic_path, crop_info = self._restore_source(entry, first_frame_dir)
+                coeff_path = self._audio_to_coeff(
+                    first_coeff_path, audio_path, save_dir, still, pose_style, job.get("audio_waveform")
+                )
+                data = get_facerender_data(
+                    coeff_path, crop_pic_path, first_coeff_path, audio_path, self.batch_size,
+                    None, None, None, expression_scale=expression_scale,
+                    still_mode=still, preprocess=self.preprocess, size=self.size
+                )
+                clips.append((save_dir, crop_info, data))
+
+            # Render in groups of batch_clips; a short group is padded with copies of its last clip,
+            # so the stacked renderer batch keeps one static shape however many jobs arrived
+            for start in range(0, len(clips), self.batch_clips):
+                group = clips[start:start + self.batch_clips]
+                video_paths.extend(self._render_group(group, source_image, enhancer))
+
+        return video_paths
@@ -0,0 +1,50 @@
+"""
+Benchmark timing for the test scripts
+
+Wall-clock time comes from perf_counter_ns (monotonic, unaffected by NTP); on CUDA the
+same span is also bracketed with CUDA events, so GPU time is reported separately from
+async orchestration and host overhead.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+class Timing:
+    """Result of a timed() block, in seconds"""
+
+    def __init__(self):
+        self.wall: float = 0.0
+        self.gpu: Optional[float] = None  # None when CUDA isn't in use
+
+    def summary(self) -> str:
+        gpu = f", GPU {self.gpu:.2f}s" if self.gpu is not None else ""
+        return f"wall {self.wall:.2f}s{gpu}"
+
+def _cuda():
+    """torch.cuda when a CUDA device is usable, else None"""
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch.cuda if torch.cuda.is_available() else None
+
+@contextmanager
+def timed():
+    """Time the enclosed block; fields of the yielded Timing are filled in on exit"""
+    timing = Timing()
+    cuda = _cuda()
+    if cuda is not None:
+        start_event = cuda.Event(enable_timing=True)
+        end_event = cuda.Event(enable_timing=True)
+        start_event.record()
+    start_ns = time.perf_counter_ns()
+    try:
+        yield timing
+    finally:
+        if cuda is not None:
+            end_event.record()
+            # Kernels launched in the block may still be running; wait so both clocks cover them
+            cuda.synchronize()
+            timing.gpu = start_event.elapsed_time(end_event) / 1000
+        timing.wall = (time.perf_counter_ns() - start_ns) / 1e9
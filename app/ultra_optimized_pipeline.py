@@ -1,38 +1,81 @@
 import os
+
+# Load CUDA kernels on first use instead of for every SM arch at context creation;
+# read when CUDA initializes and inherited by the SadTalker subprocess
+os.environ.setdefault("CUDA_MODULE_LOADING", "LAZY")
+
 import subprocess
 import sys
 import shlex
 import time
 import asyncio
 import glob
-import torch
+import functools
+import hashlib
+import heapq
+import itertools
+import shutil
+import html
+import re
 import threading
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Callable
+import torch
+from collections import OrderedDict, deque
+from typing import Dict, Callable, Optional
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx
 from tqdm import tqdm
 
+from app._sadtalker_core import latest_video as latest_video_in
+
 class ProgressTracker:
     """Real-time progress tracking with loading bars"""
     
-    def __init__(self, total_steps: int = 100):
+    # Updated on every tick, so keep attributes in fixed slots rather than a __dict__
+    __slots__ = ("total_steps", "current_step", "step_name", "start_time", "step_times",
+                 "_last_ui_ts", "_min_interval", "slot", "ctx")
+    
+    def __init__(self, total_steps: int = 100, *, slot=None, start_time: float = None):
         self.total_steps = total_steps
         self.current_step = 0
         self.step_name = "Initializing..."
-        self.start_time = time.time()
-        self.step_times = []
+        self.start_time = start_time if start_time is not None else time.time()
+        self.step_times = deque(maxlen=32)
+        
+        # Streamlit writes round-trip to the browser, so redraw at most every 50 ms
+        self._last_ui_ts = 0.0
+        self._min_interval = 0.05
         
-        # Streamlit progress elements
-        self.progress_bar = None
-        self.status_text = None
-        self.time_text = None
+        # Single Streamlit placeholder; bar, status and timing are rewritten together
+        self.slot = slot
+        # Script run context of the session that owns the slot (updates may come from another thread)
+        self.ctx = None
+        
+    def reset(self):
+        """Return the tracker to its initial state for another run"""
+        self.current_step = 0
+        self.step_name = "Initializing..."
+        self.start_time = time.time()
+        self.step_times.clear()
+        self._last_ui_ts = 0.0
+        self.slot = None
+        self.ctx = None
         
     def setup_streamlit_ui(self):
         """Setup Streamlit progress UI elements"""
         if 'st' in globals():
-            self.progress_bar = st.progress(0)
-            self.status_text = st.empty()
-            self.time_text = st.empty()
+            self.slot = st.empty()
+    
+    def _render(self, value: int, status: str, timing: str):
+        """Rewrite the progress placeholder in one message"""
+        if self.slot:
+            if self.ctx is not None:
+                # Streamlit routes the write through the current thread's script context
+                add_script_run_ctx(threading.current_thread(), self.ctx)
+            self.slot.markdown(
+                f"<progress value='{value}' max='{self.total_steps}' style='width:100%'></progress>"
+                f"<div>{html.escape(status)}</div><div>{html.escape(timing)}</div>",
+                unsafe_allow_html=True
+            )
             
     def update(self, step: int, step_name: str, details: str = ""):
         """Update progress with step information"""
@@ -41,7 +84,16 @@ class ProgressTracker:
         
         # Calculate progress percentage
         progress = min(step / self.total_steps, 1.0)
-        elapsed = time.time() - self.start_time
+        now = time.time()
+        elapsed = now - self.start_time
+        
+        # Console output
+        print(f"[{step:3d}/{self.total_steps}] {step_name} {details}")
+        
+        # Throttle UI writes; the final update always goes through
+        if now - self._last_ui_ts < self._min_interval and progress < 1.0:
+            return
+        self._last_ui_ts = now
         
         # Estimate remaining time
         if step > 0:
@@ -52,31 +104,66 @@ class ProgressTracker:
         else:
             eta_str = ""
         
-        # Update UI elements
-        if self.progress_bar:
-            self.progress_bar.progress(progress)
-        if self.status_text:
-            self.status_text.text(f" {step_name} {details}")
-        if self.time_text:
-            self.time_text.text(f" {elapsed:.1f}s elapsed{eta_str}")
-            
-        # Console output
-        print(f"[{step:3d}/{self.total_steps}] {step_name} {details}")
+        # Update UI
+        self._render(min(step, self.total_steps), f" {step_name} {details}", f" {elapsed:.1f}s elapsed{eta_str}")
         
     def complete(self, success: bool = True):
         """Mark progress as complete"""
         total_time = time.time() - self.start_time
         if success:
-            if self.status_text:
-                self.status_text.text(f" Pipeline completed successfully!")
-            if self.time_text:
-                self.time_text.text(f" Total time: {total_time:.2f}s")
+            self._render(self.total_steps, " Pipeline completed successfully!", f" Total time: {total_time:.2f}s")
             print(f" Pipeline completed in {total_time:.2f}s")
         else:
-            if self.status_text:
-                self.status_text.text(f" Pipeline failed")
+            self._render(self.current_step, " Pipeline failed", f" Failed after {total_time:.2f}s")
             print(f" Pipeline failed after {total_time:.2f}s")
 
+class ProgressTrackerPool:
+    """Reusable ProgressTracker instances, reset between runs"""
+    
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._free = []
+    
+    def get(self) -> ProgressTracker:
+        """Take a fresh tracker, reusing a released one when available"""
+        tracker = self._free.pop() if self._free else ProgressTracker(total_steps=100)
+        tracker.reset()
+        return tracker
+    
+    def release(self, tracker: ProgressTracker):
+        """Hand a finished tracker back; its UI slot belongs to the finished request"""
+        tracker.slot = None
+        tracker.ctx = None
+        if len(self._free) < self.maxsize:
+            self._free.append(tracker)
+
+_TRACKER_POOL = ProgressTrackerPool()
+
+# SadTalker log markers (tqdm descriptions), in order, with the progress they map to;
+# matched on raw output bytes so lines are only decoded when needed
+SADTALKER_STAGES = (
+    (b"landmark Det", 40, "Detecting face landmarks..."),
+    (b"3DMM Extraction", 50, "Extracting 3DMM coefficients..."),
+    (b"audio2exp", 60, "Generating expression coefficients..."),
+    (b"Face Renderer", 70, "Rendering frames..."),
+    (b"seamlessClone", 90, "Pasting face into frames..."),
+)
+TQDM_PERCENT = re.compile(rb"(\d+)%\|")
+VIDEO_NAMED_MARKER = b"The generated video is named:"
+LOG_TAIL_BYTES = 64 * 1024
+
+# Successful runs between background cleanups
+CLEANUP_EVERY = 5
+
+# Recent gTTS results by text hash (LRU): 16 kHz WAV bytes and the matching float32 waveform
+TTS_CACHE_SIZE = 64
+_TTS_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+
+@functools.lru_cache(maxsize=64)
+def _relpath(path: str, start: str) -> str:
+    """os.path.relpath, memoized for the few images that are reused across requests"""
+    return os.path.relpath(path, start)
+
 class UltraOptimizedPipeline:
     """
     Ultra-Optimized Avatar Pipeline with Aggressive Speed Improvements
@@ -90,7 +177,7 @@ class UltraOptimizedPipeline:
     6. Parallel processing where possible
     """
     
-    def __init__(self, keep_files: int = 2):
+    def __init__(self, keep_files: int = 2, in_process: bool = True):
         print(" Initializing Ultra-Optimized Pipeline...")
         
         # Setup paths
@@ -102,21 +189,81 @@ class UltraOptimizedPipeline:
         # Ultra-aggressive settings
         self.keep_files = keep_files
         
+        # Request ids for collision-free audio names and per-request video result dirs
+        self._seq = itertools.count()
+        
         # Create directories
         os.makedirs(self.audio_dir, exist_ok=True)
         os.makedirs(self.video_dir, exist_ok=True)
         
-        # Single thread for maximum resource focus
-        self.executor = ThreadPoolExecutor(max_workers=1)
-        
         # Setup ultra-optimized environment
         self._setup_ultra_optimization()
         
-        # Aggressive cleanup
-        self._aggressive_cleanup()
+        # Fixed part of the SadTalker command; only the audio, image and result dir vary per request
+        self._audio_rel_dir = os.path.relpath(self.audio_dir, self.sadtalker_dir)
+        self._base_cmd = (
+            sys.executable, "inference.py",
+            "--still",  # Fastest mode
+            "--preprocess", "crop",  # Fastest preprocessing
+            "--size", "256",  # Use available 256px model instead of missing 128px
+            "--batch_size", "16",  # Fill the tensor cores; SadTalker pads the last batch
+            # Skip ALL enhancement for maximum speed
+        ) + (("--cpu",) if self.device == "cpu" else ())
+        
+        # Load SadTalker once and keep it resident; the subprocess command is the fallback
+        self.default_image = os.path.join(self.sadtalker_dir, "examples", "source_image", "art_3.png")
+        self.runner = None
+        if in_process:
+            try:
+                from app.sadtalker_runner import SadTalkerRunner
+                
+                # SadTalker has no MPS path
+                device = "cuda" if self.device == "cuda" else "cpu"
+                # 16 frames per renderer step keeps the tensor cores busy; halved on CUDA OOM
+                self.runner = SadTalkerRunner(self.sadtalker_dir, device=device, size=256, preprocess="crop",
+                                              batch_size=16)
+            except ImportError as e:
+                print(f"   In-process SadTalker unavailable ({e}), using subprocess")
+        
+        if self.runner is not None:
+            # Fixed 256px shape: capture the renderer's CUDA graphs now (compiled runners
+            # already warmed up while loading) instead of on the first request
+            if self.runner.device == "cuda" and not self.runner.compile_models:
+                self.runner.warmup(iters=2)
+            # The default image's crop and 3DMM fit are reused by every request that uses it
+            self.runner.preprocess_source(self.default_image)
+        
+        # Bound concurrent gTTS requests
+        self._tts_slots = asyncio.Semaphore(4)
+        
+        # Cleanup runs in the background after each generation, not on init
+        self._cleanup_task = None
+        self._runs_since_cleanup = 0
+        
+        # Decoded waveforms of generated audio by path, handed to the in-process runner
+        self._waveforms = {}
+        
+        # Two-stage request pipeline (audio, then video); workers start on first submit
+        self._worker_loop = None
+        self._audio_queue = None
+        self._video_queue = None
+        self._workers = []
         
         print(" Ultra-Optimized Pipeline initialized")
     
+    async def warmup(self, seconds: float = 1.0):
+        """Run one silent clip through the full SadTalker graph so the first request starts warm"""
+        if self.runner is None:
+            return
+        print(" Warming up SadTalker...")
+        warmup_start = time.time()
+        
+        try:
+            await asyncio.to_thread(self.runner.warmup_full, self.default_image, seconds)
+            print(f"   Warm in {time.time() - warmup_start:.2f}s")
+        except Exception as e:
+            print(f"   Warmup failed ({e}), first request will be slower")
+    
     def _setup_ultra_optimization(self):
         """Setup ultra-aggressive optimization environment"""
         print(" Setting up ultra-optimization environment...")
@@ -125,6 +272,9 @@ class UltraOptimizedPipeline:
         if torch.cuda.is_available():
             self.device = "cuda"
             print(f"   CUDA GPU detected")
+            # Fixed 256px render shapes: pick the fastest cuDNN algorithms during warmup,
+            # before the renderer's CUDA graphs are captured
+            torch.backends.cudnn.benchmark = True
         elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
             self.device = "mps"
             print(f"   Apple MPS detected")
@@ -147,50 +297,80 @@ class UltraOptimizedPipeline:
         """Aggressive cleanup of all old files"""
         print(" Aggressive cleanup...")
         
-        # Remove ALL old files except most recent
+        # Remove ALL old files except most recent; one scandir per directory, and
+        # SadTalker's per-run subdirectories are removed whole
         for directory in [self.audio_dir, self.video_dir]:
-            all_files = []
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    all_files.append((file_path, os.path.getmtime(file_path)))
+            with os.scandir(directory) as it:
+                dir_entries = list(it)
+            # Let a directory grow to twice the budget before paying for stats and deletes
+            if len(dir_entries) <= 2 * self.keep_files:
+                continue
+            entries = [(e.path, e.is_dir(), e.stat().st_mtime) for e in dir_entries]
             
-            if len(all_files) > self.keep_files:
-                all_files.sort(key=lambda x: x[1], reverse=True)
-                for file_path, _ in all_files[self.keep_files:]:
-                    try:
-                        os.remove(file_path)
-                    except:
-                        pass
+            # Only the victims need ordering: O(N log k) instead of a full sort
+            for path, is_dir, _ in heapq.nsmallest(len(entries) - self.keep_files, entries, key=lambda x: x[2]):
+                if is_dir:
+                    shutil.rmtree(path, ignore_errors=True)
+                    continue
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
         
         print(" Aggressive cleanup completed")
     
+    def _schedule_cleanup(self):
+        """Run _aggressive_cleanup in a worker thread without waiting for it, every few runs"""
+        self._runs_since_cleanup += 1
+        if self._runs_since_cleanup < CLEANUP_EVERY:
+            return
+        # Queued requests' audio files must survive until their video is rendered
+        if self._video_queue is not None and not self._video_queue.empty():
+            return
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._runs_since_cleanup = 0
+            self._cleanup_task = asyncio.create_task(asyncio.to_thread(self._aggressive_cleanup))
+    
     async def generate_voice_ultra_fast(self, text: str, progress: ProgressTracker) -> str:
         """Ultra-fast audio generation with progress tracking"""
         progress.update(10, "Audio Generation", "Starting TTS...")
         
         try:
-            from gtts import gTTS
-            import io
+            from app.generate_audio_gtts import synthesize_to_memory
             
             # Truncate text for speed
             text = text[:200] if len(text) > 200 else text
             progress.update(15, "Audio Generation", f"Processing {len(text)} chars...")
             
-            # Generate audio with minimal settings
-            tts = gTTS(text=text, lang='en', slow=False)
-            progress.update(20, "Audio Generation", "Generating audio...")
-            
-            # Save audio
-            timestamp = int(time.time() * 1000)
-            audio_filename = f"audio_{timestamp}.mp3"
+            # Save audio as 16 kHz mono WAV, the format SadTalker resamples to anyway
+            # (unique even for concurrent sessions; the id also names the request's video result dir)
+            audio_filename = f"audio_{os.getpid()}_{next(self._seq)}_{time.time_ns()}.wav"
             audio_path = os.path.join(self.audio_dir, audio_filename)
             
-            tts.save(audio_path)
+            # Repeated text reuses the audio from memory instead of another Google round-trip
+            key = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+            cached = _TTS_CACHE.get(key)
+            if cached is None:
+                progress.update(20, "Audio Generation", "Generating audio...")
+                # The HTTP round-trip to Google and the MP3 decode block, so run them off the event loop
+                async with self._tts_slots:
+                    cached = await asyncio.to_thread(synthesize_to_memory, text)
+                _TTS_CACHE[key] = cached
+                if len(_TTS_CACHE) > TTS_CACHE_SIZE:
+                    _TTS_CACHE.popitem(last=False)
+            else:
+                _TTS_CACHE.move_to_end(key)
+                progress.update(20, "Audio Generation", "Reusing cached audio...")
+            wav_bytes, waveform = cached
+            
+            # The WAV on disk is for SadTalker's muxing (and the subprocess fallback); the
+            # in-process runner takes the decoded waveform directly
+            with open(audio_path, "wb") as f:
+                f.write(wav_bytes)
+            self._waveforms[audio_path] = waveform
             progress.update(25, "Audio Generation", "Audio saved")
             
-            audio_size = os.path.getsize(audio_path)
-            print(f"   Audio: {audio_size:,} bytes")
+            print(f"   Audio: {len(wav_bytes):,} bytes")
             
             return audio_path
             
@@ -198,45 +378,155 @@ class UltraOptimizedPipeline:
             print(f"   Audio generation failed: {e}")
             raise
     
-    def _get_ultra_fast_command(self, audio_filename: str, image_path: str = None) -> list:
+    def _result_dir_for(self, audio_filename: str) -> str:
+        """Per-request output directory, keyed by the audio file's unique id"""
+        request_id = os.path.splitext(os.path.basename(audio_filename))[0].replace("audio_", "", 1)
+        return os.path.join(self.video_dir, request_id)
+    
+    def _get_ultra_fast_command(self, audio_filename: str, image_path: str = None) -> tuple:
         """Get ultra-fast SadTalker command with minimal settings"""
         
-        # Fix audio path - use relative path from SadTalker directory
-        audio_rel_path = os.path.relpath(audio_filename, self.sadtalker_dir)
+        # Fix audio path - use relative path from SadTalker directory; audio normally
+        # lives in audio_dir, whose relative path is fixed
+        if os.path.dirname(audio_filename) == self.audio_dir:
+            audio_rel_path = os.path.join(self._audio_rel_dir, os.path.basename(audio_filename))
+        else:
+            audio_rel_path = os.path.relpath(audio_filename, self.sadtalker_dir)
         
         # Use custom image if provided, otherwise fallback to default
         if image_path and os.path.exists(image_path):
-            # Convert to relative path from SadTalker directory
-            image_rel_path = os.path.relpath(image_path, self.sadtalker_dir)
+            # Convert to relative path from SadTalker directory (memoized per image)
+            image_rel_path = _relpath(image_path, self.sadtalker_dir)
             print(f"   Using custom image: {image_path}")
         else:
             # Fallback to default image for ultra-fast processing
             image_rel_path = "examples/source_image/art_3.png"
             print(f"   Using default image for ultra-fast processing")
         
-        command = [
-            "python", "inference.py",
-            "--driven_audio", audio_rel_path,
-            "--source_image", image_rel_path,
-            "--result_dir", "../app/video",
-            "--still",  # Fastest mode
-            "--preprocess", "crop",  # Fastest preprocessing
-            "--size", "256",  # Use available 256px model instead of missing 128px
-            "--batch_size", "1",  # Minimal batch
-            # Skip ALL enhancement for maximum speed
-        ]
-        
-        # Add CPU flag if needed
-        if self.device == "cpu":
-            command.append("--cpu")
+        result_rel_dir = os.path.relpath(self._result_dir_for(audio_filename), self.sadtalker_dir)
+        command = self._base_cmd + ("--driven_audio", audio_rel_path, "--source_image", image_rel_path,
+                                    "--result_dir", result_rel_dir)
         
         print(f"   Ultra-fast command: {' '.join(command)}")
         return command
     
-    async def generate_video_ultra_fast(self, audio_filename: str, progress: ProgressTracker, image_path: str = None) -> str:
+    async def _run_sadtalker(self, command: tuple, progress: ProgressTracker) -> Optional[str]:
+        """Run SadTalker as an asyncio subprocess, advancing progress as its stages start; returns the video path it reports"""
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=self.sadtalker_dir,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        print(f"   Process started with PID: {process.pid}")
+        
+        stage_index = 0
+        last_step = None
+        # Logs are not buffered; only the last 64 KiB of raw output is kept for the error message
+        tail = bytearray()
+        
+        video_path = None
+        
+        def handle_line(line: bytes):
+            nonlocal stage_index, last_step, video_path
+            # inference.py reports its output relative to its own working directory
+            if line.startswith(VIDEO_NAMED_MARKER):
+                reported = line[len(VIDEO_NAMED_MARKER):].decode(errors="replace").strip()
+                video_path = os.path.normpath(os.path.join(self.sadtalker_dir, reported))
+                return
+            # Stages appear in order; only react to the next one
+            stage_started = False
+            for index in range(stage_index, len(SADTALKER_STAGES)):
+                if SADTALKER_STAGES[index][0] in line:
+                    stage_index = index + 1
+                    stage_started = True
+                    break
+            match = TQDM_PERCENT.search(line)
+            if stage_index == 0 or not (match or stage_started):
+                return
+            
+            # Interpolate within the current stage from tqdm's percentage
+            _, start, details = SADTALKER_STAGES[stage_index - 1]
+            end = SADTALKER_STAGES[stage_index][1] if stage_index < len(SADTALKER_STAGES) else 94
+            percent = int(match.group(1)) if match else 0
+            step = start + (end - start) * percent // 100
+            if step != last_step:
+                last_step = step
+                progress.update(step, "Video Generation", f"{details} {percent}%" if match else details)
+        
+        async def pump(stream):
+            # tqdm redraws with carriage returns, so split on those as well as newlines
+            pending = b""
+            while True:
+                chunk = await stream.read(LOG_TAIL_BYTES)
+                if not chunk:
+                    break
+                tail.extend(chunk)
+                if len(tail) > LOG_TAIL_BYTES:
+                    del tail[:-LOG_TAIL_BYTES]
+                *lines, pending = re.split(rb"[\r\n]", pending + chunk)
+                for line in lines:
+                    if line.strip():
+                        handle_line(line.rstrip())
+            if pending.strip():
+                handle_line(pending.rstrip())
+        
+        await asyncio.gather(pump(process.stdout), pump(process.stderr))
+        returncode = await process.wait()
+        print(f"   Process completed with return code: {returncode}")
+        
+        if returncode != 0:
+            # Decode the tail once, keeping the last 64 non-empty lines
+            lines = [line for line in re.split(r"[\r\n]", tail.decode(errors="replace")) if line.strip()]
+            stderr = "\n".join(lines[-64:])
+            print(f"   STDERR: {stderr[-500:]}...")
+            error_msg = f"SadTalker failed with return code {returncode}\nSTDERR: {stderr}"
+            raise subprocess.CalledProcessError(returncode, command, error_msg)
+        return video_path
+    
+    def _source_image(self, image_path: str = None) -> str:
+        """Custom image if it exists, otherwise the default image"""
+        if image_path and os.path.exists(image_path):
+            return image_path
+        return self.default_image
+    
+    async def prepare_source(self, image_path: str = None) -> Optional[dict]:
+        """Crop the source image and fit its 3DMM coefficients off the event loop (cached per image)"""
+        if self.runner is None:
+            return None
+        return await asyncio.to_thread(self.runner.preprocess_source, self._source_image(image_path))
+    
+    async def _generate_video_in_process(self, audio_path: str, progress: ProgressTracker, image_path: str = None,
+                                         source_entry: dict = None) -> str:
+        """Generate video with the resident SadTalker models"""
+        source_image = self._source_image(image_path)
+        if source_image == image_path:
+            print(f"   Using custom image: {image_path}")
+        else:
+            print(f"   Using default image for ultra-fast processing")
+        
+        progress.update(40, "Video Generation", "Rendering with resident models...")
+        print(f"   Device: {self.runner.device.upper()} (models already loaded)")
+        
+        # Inference blocks, so keep it off the event loop
+        video_path = await asyncio.to_thread(self.runner.run, audio_path, source_image, self._result_dir_for(audio_path),
+                                             still=True, source_entry=source_entry,
+                                             audio_waveform=self._waveforms.pop(audio_path, None))
+        
+        video_size = os.path.getsize(video_path)
+        progress.update(98, "Video Generation", f"Video ready ({video_size:,} bytes)")
+        print(f"   Video: {video_size:,} bytes")
+        return video_path
+    
+    async def generate_video_ultra_fast(self, audio_filename: str, progress: ProgressTracker, image_path: str = None,
+                                        source_entry: dict = None) -> str:
         """Ultra-fast video generation with progress tracking"""
         progress.update(30, "Video Generation", "Preparing SadTalker...")
         
+        if self.runner is not None:
+            return await self._generate_video_in_process(audio_filename, progress, image_path, source_entry)
+        self._waveforms.pop(audio_filename, None)
+        
         # Get ultra-fast command
         command = self._get_ultra_fast_command(audio_filename, image_path)
         
@@ -246,69 +536,29 @@ class UltraOptimizedPipeline:
         print(f"   Working directory: {self.sadtalker_dir}")
         print(f"   Command: {' '.join(command)}")
         
-        # Run with progress monitoring
-        loop = asyncio.get_event_loop()
-        
-        def run_with_progress():
-            try:
-                process = subprocess.Popen(
-                    command,
-                    cwd=self.sadtalker_dir,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    bufsize=1,
-                    universal_newlines=True
-                )
-                
-                print(f"   Process started with PID: {process.pid}")
-                
-                # Wait for completion with NO timeout - let it run to completion
-                try:
-                    stdout, stderr = process.communicate()  # No timeout - let it complete naturally
-                    print(f"   Process completed with return code: {process.returncode}")
-                    
-                    # Enhanced error reporting
-                    if stdout:
-                        print(f"   STDOUT: {stdout[:200]}...")
-                    if stderr:
-                        print(f"   STDERR: {stderr[:500]}...")
-                    
-                    if process.returncode != 0:
-                        error_msg = f"SadTalker failed with return code {process.returncode}"
-                        if stderr:
-                            error_msg += f"\nSTDERR: {stderr}"
-                        raise subprocess.CalledProcessError(process.returncode, command, error_msg)
-                    return stdout, stderr
-                    
-                except Exception as e:
-                    print(f"   Process error: {str(e)}")
-                    raise e
-            except Exception as e:
-                print(f"   Failed to start SadTalker process: {str(e)}")
-                raise e
-        
+        # Run with progress monitoring; the event loop waits on the child process,
+        # so no worker thread is tied up for the whole inference
+        # Only this request's output lives in its result dir
+        result_dir = self._result_dir_for(audio_filename)
         try:
-            stdout, stderr = await loop.run_in_executor(self.executor, run_with_progress)
+            reported_video = await self._run_sadtalker(command, progress)
             progress.update(95, "Video Generation", "Finding output video...")
             
-            # Find the most recent video file
-            video_files = []
-            for root, dirs, files in os.walk(self.video_dir):
-                for file in files:
-                    if file.endswith('.mp4'):
-                        video_files.append(os.path.join(root, file))
+            if reported_video and os.path.isfile(reported_video):
+                latest_video = reported_video
+            else:
+                # SadTalker didn't report its video name; it is the .mp4 in this request's dir
+                latest_video = latest_video_in(result_dir)
             
-            if video_files:
-                latest_video = max(video_files, key=os.path.getctime)
+            if latest_video:
                 video_size = os.path.getsize(latest_video)
                 progress.update(98, "Video Generation", f"Video ready ({video_size:,} bytes)")
                 print(f"   Video: {video_size:,} bytes")
                 return latest_video
             else:
                 # Check if any files were created
-                print(f"   No video files found in {self.video_dir}")
-                print(f"   Directory contents: {os.listdir(self.video_dir) if os.path.exists(self.video_dir) else 'Directory does not exist'}")
+                print(f"   No video files found in {result_dir}")
+                print(f"   Directory contents: {os.listdir(result_dir) if os.path.exists(result_dir) else 'Directory does not exist'}")
                 raise RuntimeError("No video file found after SadTalker execution")
                 
         except subprocess.CalledProcessError as e:
@@ -319,14 +569,9 @@ class UltraOptimizedPipeline:
             print(f"   Unexpected error in video generation: {e}")
             raise
     
-    async def generate_avatar_video(self, text: str, image_path: str = None, progress_callback: Callable = None) -> Dict[str, str]:
-        """
-        Ultra-optimized pipeline with comprehensive progress tracking
-        """
-        pipeline_start = time.time()
-        
-        # Setup progress tracker
-        progress = ProgressTracker(total_steps=100)
+    def _start_progress(self, text: str, progress_callback: Callable = None) -> ProgressTracker:
+        """Create a request's progress tracker and hand it to the caller"""
+        progress = _TRACKER_POOL.get()
         if progress_callback:
             progress_callback(progress)
         
@@ -334,81 +579,174 @@ class UltraOptimizedPipeline:
         print(f" Starting ultra-optimized avatar pipeline...")
         print(f" Text: '{text[:50]}{'...' if len(text) > 50 else ''}'")
         print(f" Target: Maximum speed with minimal quality trade-offs")
+        return progress
+    
+    def _build_result(self, progress: ProgressTracker, audio_path: str, video_path: str,
+                      pipeline_start: float, audio_time: float, video_time: float) -> Dict[str, str]:
+        """Result dictionary for a generated video"""
+        # Calculate total time
+        total_time = time.time() - pipeline_start
+        
+        progress.update(99, "Finalizing", "Preparing results...")
+        
+        # Verify output
+        if video_path and os.path.exists(video_path):
+            quality_check = "SPEED_OPTIMIZED"
+        else:
+            quality_check = "ERROR"
+        
+        # Calculate speedup from baseline
+        baseline_time = 7519.0  # From previous slow run
+        speedup = baseline_time / total_time if total_time > 0 else 0
+        
+        # Prepare result
+        result = {
+            "audio_path": audio_path,
+            "video_path": os.path.relpath(video_path, self.project_root) if video_path else None,
+            "avatar_path": "SadTalker/examples/source_image/art_3.png",
+            "total_time": round(total_time, 3),
+            "audio_time": round(audio_time, 3),
+            "video_time": round(video_time, 3),
+            "success": True,
+            "quality": quality_check,
+            "quality_mode": "ultra_fast",
+            "speedup": round(speedup, 1),
+            "backend": f"Ultra-Optimized SadTalker ({self.device.upper()})",
+            "optimization_level": "MAXIMUM",
+            "target_achieved": total_time < 60.0,
+            "performance_notes": f"{speedup:.1f}x faster than baseline"
+        }
+        
+        progress.update(100, "Complete", f"Generated in {total_time:.1f}s!")
+        progress.complete(success=True)
+        
+        print(f"\n Ultra-optimized pipeline completed!")
+        print(f"   Total: {total_time:.2f}s")
+        print(f"   Audio: {audio_time:.2f}s")
+        print(f"   Video: {video_time:.2f}s")
+        print(f"   Speedup: {speedup:.1f}x faster than baseline")
+        print(f"   Target achieved: {' YES' if total_time < 60.0 else ' NO'}")
+        
+        # Cleanup after success, off the request path
+        self._schedule_cleanup()
+        
+        return result
+    
+    def _build_error(self, progress: ProgressTracker, pipeline_start: float, error: Exception) -> Dict[str, str]:
+        """Result dictionary for a failed request"""
+        error_time = time.time() - pipeline_start
+        progress.complete(success=False)
+        print(f"\n Ultra-optimized pipeline failed after {error_time:.2f}s: {error}")
+        
+        return {
+            "error": str(error),
+            "total_time": round(error_time, 3),
+            "success": False,
+            "quality": "ERROR",
+            "backend": f"Ultra-Optimized SadTalker ({self.device.upper()})",
+            "optimization_level": "MAXIMUM"
+        }
+    
+    async def generate_avatar_video(self, text: str, image_path: str = None, progress_callback: Callable = None) -> Dict[str, str]:
+        """
+        Ultra-optimized pipeline with comprehensive progress tracking
+        """
+        pipeline_start = time.time()
+        progress = self._start_progress(text, progress_callback)
         
         try:
-            # Step 1: Ultra-fast audio generation
+            # Step 1: Ultra-fast audio generation, overlapped with the source image crop
             progress.update(5, "Audio Generation", "Initializing TTS...")
             audio_start = time.time()
-            audio_path = await self.generate_voice_ultra_fast(text, progress)
+            audio_path, source_entry = await asyncio.gather(
+                self.generate_voice_ultra_fast(text, progress), self.prepare_source(image_path)
+            )
             audio_time = time.time() - audio_start
             
             # Step 2: Ultra-fast video generation
             video_start = time.time()
-            video_path = await self.generate_video_ultra_fast(audio_path, progress, image_path)
+            video_path = await self.generate_video_ultra_fast(audio_path, progress, image_path, source_entry)
             video_time = time.time() - video_start
             
-            # Calculate total time
-            total_time = time.time() - pipeline_start
-            
-            progress.update(99, "Finalizing", "Preparing results...")
-            
-            # Verify output
-            if video_path and os.path.exists(video_path):
-                video_size = os.path.getsize(video_path)
-                quality_check = "SPEED_OPTIMIZED"
-            else:
-                quality_check = "ERROR"
-            
-            # Calculate speedup from baseline
-            baseline_time = 7519.0  # From previous slow run
-            speedup = baseline_time / total_time if total_time > 0 else 0
-            
-            # Prepare result
-            result = {
-                "audio_path": audio_path,
-                "video_path": os.path.relpath(video_path, self.project_root) if video_path else None,
-                "avatar_path": "SadTalker/examples/source_image/art_3.png",
-                "total_time": round(total_time, 3),
-                "audio_time": round(audio_time, 3),
-                "video_time": round(video_time, 3),
-                "success": True,
-                "quality": quality_check,
-                "quality_mode": "ultra_fast",
-                "speedup": round(speedup, 1),
-                "backend": f"Ultra-Optimized SadTalker ({self.device.upper()})",
-                "optimization_level": "MAXIMUM",
-                "target_achieved": total_time < 60.0,
-                "performance_notes": f"{speedup:.1f}x faster than baseline"
-            }
-            
-            progress.update(100, "Complete", f"Generated in {total_time:.1f}s!")
-            progress.complete(success=True)
-            
-            print(f"\n Ultra-optimized pipeline completed!")
-            print(f"   Total: {total_time:.2f}s")
-            print(f"   Audio: {audio_time:.2f}s")
-            print(f"   Video: {video_time:.2f}s")
-            print(f"   Speedup: {speedup:.1f}x faster than baseline")
-            print(f"   Target achieved: {' YES' if total_time < 60.0 else ' NO'}")
-            
-            # Cleanup after success
-            self._aggressive_cleanup()
-            
-            return result
+            return self._build_result(progress, audio_path, video_path, pipeline_start, audio_time, video_time)
             
         except Exception as e:
-            error_time = time.time() - pipeline_start
-            progress.complete(success=False)
-            print(f"\n Ultra-optimized pipeline failed after {error_time:.2f}s: {e}")
-            
-            return {
-                "error": str(e),
-                "total_time": round(error_time, 3),
-                "success": False,
-                "quality": "ERROR",
-                "backend": f"Ultra-Optimized SadTalker ({self.device.upper()})",
-                "optimization_level": "MAXIMUM"
-            }
+            return self._build_error(progress, pipeline_start, e)
+        finally:
+            _TRACKER_POOL.release(progress)
+    
+    def _start_workers(self):
+        """Start the audio and video stage workers on the running event loop"""
+        loop = asyncio.get_running_loop()
+        # Workers are bound to one loop; callers using asyncio.run get a fresh loop each time
+        if self._worker_loop is loop:
+            return
+        self._worker_loop = loop
+        self._audio_queue = asyncio.Queue()
+        self._video_queue = asyncio.Queue()
+        self._workers = [loop.create_task(self._audio_worker()), loop.create_task(self._video_worker())]
+    
+    async def submit(self, text: str, image_path: str = None, progress_callback: Callable = None) -> Dict[str, str]:
+        """Queue a request; its audio is generated while earlier requests are still rendering"""
+        self._start_workers()
+        job = {
+            "text": text,
+            "image_path": image_path,
+            "start": time.time(),
+            "progress": self._start_progress(text, progress_callback),
+            "future": asyncio.get_running_loop().create_future(),
+        }
+        await self._audio_queue.put(job)
+        return await job["future"]
+    
+    async def _audio_worker(self):
+        """Stage 1: text to speech, handing finished audio to the video stage"""
+        while True:
+            job = await self._audio_queue.get()
+            # The face crop runs in a worker thread while gTTS waits on the network
+            job["source_task"] = asyncio.create_task(self.prepare_source(job["image_path"]))
+            try:
+                job["progress"].update(5, "Audio Generation", "Initializing TTS...")
+                audio_start = time.time()
+                job["audio_path"] = await self.generate_voice_ultra_fast(job["text"], job["progress"])
+                job["audio_time"] = time.time() - audio_start
+            except Exception as e:
+                job["source_task"].cancel()
+                if not job["future"].done():
+                    job["future"].set_result(self._build_error(job["progress"], job["start"], e))
+                _TRACKER_POOL.release(job["progress"])
+                continue
+            await self._video_queue.put(job)
+    
+    async def _video_worker(self):
+        """Stage 2: one SadTalker run at a time"""
+        while True:
+            job = await self._video_queue.get()
+            try:
+                source_entry = await job["source_task"]
+                video_start = time.time()
+                video_path = await self.generate_video_ultra_fast(job["audio_path"], job["progress"], job["image_path"],
+                                                                  source_entry)
+                result = self._build_result(job["progress"], job["audio_path"], video_path, job["start"],
+                                            job["audio_time"], time.time() - video_start)
+            except Exception as e:
+                result = self._build_error(job["progress"], job["start"], e)
+            if not job["future"].done():
+                job["future"].set_result(result)
+            _TRACKER_POOL.release(job["progress"])
+
+# One shared pipeline; it holds no per-request state
+_PIPELINE_SINGLETON: Optional[UltraOptimizedPipeline] = None
+_PIPELINE_LOCK = asyncio.Lock()
+
+async def _get_pipeline() -> UltraOptimizedPipeline:
+    """Return the shared pipeline, creating it on first use"""
+    global _PIPELINE_SINGLETON
+    async with _PIPELINE_LOCK:
+        if _PIPELINE_SINGLETON is None:
+            # Model loading blocks, so keep it off the event loop
+            _PIPELINE_SINGLETON = await asyncio.to_thread(UltraOptimizedPipeline)
+    return _PIPELINE_SINGLETON
 
 # Convenience functions
 async def generate_ultra_fast_avatar(text: str, image_path: str = None, progress_callback: Callable = None) -> Dict[str, str]:
@@ -423,8 +761,8 @@ async def generate_ultra_fast_avatar(text: str, image_path: str = None, progress
     Returns:
         Dictionary with results and performance metrics
     """
-    pipeline = UltraOptimizedPipeline()
-    return await pipeline.generate_avatar_video(text, image_path, progress_callback)
+    pipeline = await _get_pipeline()
+    return await pipeline.submit(text, image_path, progress_callback)
 
 async def generate_ultra_fast_avatar_with_timing(text: str, image_path: str = None, progress_elements: dict = None) -> dict:
     """
@@ -439,18 +777,16 @@ async def generate_ultra_fast_avatar_with_timing(text: str, image_path: str = No
     print(f"   Target: Maximum speed with minimal quality trade-offs")
     
     # Initialize progress tracker
-    progress = ProgressTracker(
-        progress_bar=progress_elements.get('progress_bar') if progress_elements else None,
-        status_text=progress_elements.get('status_text') if progress_elements else None,
-        time_text=progress_elements.get('time_text') if progress_elements else None,
-        details_text=progress_elements.get('details_text') if progress_elements else None,
-        start_time=pipeline_start_time
-    )
+    progress = _TRACKER_POOL.get()
+    progress.start_time = pipeline_start_time
+    if progress_elements:
+        progress.slot = progress_elements.get('slot')
+        progress.ctx = progress_elements.get('ctx')
     
     try:
         # Initialize pipeline
         progress.update(0, "Initialization", "Starting ultra-optimized pipeline...")
-        pipeline = UltraOptimizedPipeline()
+        pipeline = await _get_pipeline()
         
         # Audio generation
         progress.update(5, "Audio Generation", "Initializing TTS...")
@@ -514,23 +850,12 @@ async def generate_ultra_fast_avatar_with_timing(text: str, image_path: str = No
             "baseline_time": 7519,
             "backend": "Ultra-Optimized SadTalker"
         }
+    finally:
+        _TRACKER_POOL.release(progress)
 
 def setup_streamlit_progress_ui():
     """Setup Streamlit UI for progress tracking"""
     st.markdown("### Ultra-Optimized Pipeline Progress")
     
-    # Create placeholder containers
-    progress_container = st.container()
-    
-    with progress_container:
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        time_text = st.empty()
-        details_text = st.empty()
-    
-    return {
-        'progress_bar': progress_bar,
-        'status_text': status_text,
-        'time_text': time_text,
-        'details_text': details_text
-    }
+    # One placeholder that ProgressTracker rewrites atomically
+    return {'slot': st.empty()}
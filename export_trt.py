@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Export the SadTalker face renderer to ONNX and build a TensorRT FP16 (or INT8) engine
+
+SadTalkerRunner picks the engine up automatically from models/trt/face_render_<size>_int8.engine
+or models/trt/face_render_<size>.engine.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import torch
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+SADTALKER_DIR = os.path.join(PROJECT_ROOT, "SadTalker")
+TRT_DIR = os.path.join(PROJECT_ROOT, "models", "trt")
+INPUT_NAMES = ("source_image", "kp_source", "kp_driving")
+
+class FaceRenderExport(torch.nn.Module):
+    """Generator forward on plain tensors, as ONNX needs"""
+
+    def __init__(self, generator):
+        super().__init__()
+        self.generator = generator
+
+    def forward(self, source_image, kp_source, kp_driving):
+        out = self.generator(source_image, kp_source={'value': kp_source}, kp_driving={'value': kp_driving})
+        return out['prediction']
+
+def load_runner(size: int, batch_size: int):
+    """Load SadTalker with the renderer as a plain FP32 NCHW eager model"""
+    sys.path.insert(0, PROJECT_ROOT)
+    from app.sadtalker_runner import SadTalkerRunner
+
+    # Never an existing engine; TensorRT chooses precision and layout itself
+    return SadTalkerRunner(SADTALKER_DIR, device="cuda", size=size, half=False, batch_size=batch_size,
+                           compile_models=False, use_cuda_graph=False, channels_last=False,
+                           use_trt=False)
+
+def export_onnx(runner, size: int, batch_size: int, onnx_path: str):
+    """Export the runner's renderer with a dynamic batch dimension"""
+    model = FaceRenderExport(runner.animate_from_coeff.generator).eval()
+
+    dummy = (
+        torch.zeros(batch_size, 3, size, size, device="cuda"),
+        torch.zeros(batch_size, 15, 3, device="cuda"),
+        torch.zeros(batch_size, 15, 3, device="cuda"),
+    )
+    batch_axis = {0: "batch"}
+    print(f"📦 Exporting face renderer to {onnx_path}")
+    with torch.inference_mode():
+        torch.onnx.export(
+            model, dummy, onnx_path, opset_version=17,
+            input_names=list(INPUT_NAMES), output_names=["prediction"],
+            dynamic_axes={"source_image": batch_axis, "kp_source": batch_axis,
+                          "kp_driving": batch_axis, "prediction": batch_axis}
+        )
+
+def build_engine(onnx_path: str, engine_path: str, size: int, batch_size: int):
+    """Build an FP16 engine with trtexec; batch sizes 1..batch_size are supported"""
+    def shapes(batch):
+        return f"source_image:{batch}x3x{size}x{size},kp_source:{batch}x15x3,kp_driving:{batch}x15x3"
+
+    command = [
+        "trtexec", f"--onnx={onnx_path}", f"--saveEngine={engine_path}",
+        "--fp16", "--builderOptimizationLevel=5",
+        f"--minShapes={shapes(1)}", f"--optShapes={shapes(batch_size)}", f"--maxShapes={shapes(batch_size)}",
+    ]
+    if shutil.which("trtexec") is None:
+        print("⚠️ trtexec not found; build the engine with:")
+        print("   " + " ".join(command))
+        return
+    print(f"🔧 Building TensorRT engine {engine_path}")
+    subprocess.run(command, check=True)
+    print("✅ Engine ready")
+
+def collect_calibration(runner, audio_path: str, image_path: str, frames: int) -> list:
+    """Record the renderer's inputs during one real run, as full calibration batches"""
+    batches = []
+    render = runner._render_frames
+
+    def record(source_image, kp_source, kp_driving):
+        if len(batches) * runner.batch_size < frames and source_image.shape[0] == runner.batch_size:
+            batches.append(tuple(t.detach().float().cpu() for t in (source_image, kp_source, kp_driving)))
+        return render(source_image, kp_source, kp_driving)
+
+    print(f"🎯 Collecting {frames} calibration frames from {os.path.basename(audio_path)}")
+    runner._render_frames = record
+    try:
+        with tempfile.TemporaryDirectory() as result_dir:
+            runner.run(audio_path, image_path, result_dir, still=True)
+    finally:
+        del runner._render_frames
+    if not batches:
+        raise RuntimeError(f"Calibration audio is shorter than one batch of {runner.batch_size} frames")
+    return batches
+
+def make_calibrator(batches: list, cache_path: str):
+    """Entropy calibrator feeding recorded renderer inputs; the scales are cached in cache_path"""
+    import tensorrt as trt
+
+    class FaceRenderCalibrator(trt.IInt8EntropyCalibrator2):
+        def __init__(self):
+            trt.IInt8EntropyCalibrator2.__init__(self)
+            self.batches = iter(batches)
+            self.device_inputs = {}  # keeps the current batch alive on the GPU
+
+        def get_batch_size(self):
+            # Informational only for explicit-batch networks (and there are no batches when the cache is reused)
+            return batches[0][0].shape[0] if batches else 1
+
+        def get_batch(self, names):
+            batch = next(self.batches, None)
+            if batch is None:
+                return None
+            self.device_inputs = {name: t.cuda().contiguous() for name, t in zip(INPUT_NAMES, batch)}
+            return [int(self.device_inputs[name].data_ptr()) for name in names]
+
+        def read_calibration_cache(self):
+            if os.path.exists(cache_path):
+                with open(cache_path, "rb") as f:
+                    return f.read()
+            return None
+
+        def write_calibration_cache(self, cache):
+            with open(cache_path, "wb") as f:
+                f.write(cache)
+
+    return FaceRenderCalibrator()
+
+def build_int8_engine(onnx_path: str, engine_path: str, size: int, batch_size: int, calibrator):
+    """Build an INT8 engine (FP16 fallback per layer) with the TensorRT Python API"""
+    import tensorrt as trt
+
+    logger = trt.Logger(trt.Logger.WARNING)
+    builder = trt.Builder(logger)
+    network = builder.create_network(1 << int(trt.NetworkDefinitionCreationFlag.EXPLICIT_BATCH))
+    parser = trt.OnnxParser(network, logger)
+    with open(onnx_path, "rb") as f:
+        if not parser.parse(f.read()):
+            errors = "; ".join(str(parser.get_error(i)) for i in range(parser.num_errors))
+            raise RuntimeError(f"Could not parse {onnx_path}: {errors}")
+
+    config = builder.create_builder_config()
+    config.set_flag(trt.BuilderFlag.FP16)
+    config.set_flag(trt.BuilderFlag.INT8)
+    config.int8_calibrator = calibrator
+    config.builder_optimization_level = 5
+
+    profile = builder.create_optimization_profile()
+    for name, shape in zip(INPUT_NAMES, ((3, size, size), (15, 3), (15, 3))):
+        profile.set_shape(name, (1, *shape), (batch_size, *shape), (batch_size, *shape))
+    config.add_optimization_profile(profile)
+    config.set_calibration_profile(profile)
+
+    print(f"🔧 Building INT8 TensorRT engine {engine_path}")
+    serialized = builder.build_serialized_network(network, config)
+    if serialized is None:
+        raise RuntimeError("TensorRT engine build failed")
+    with open(engine_path, "wb") as f:
+        f.write(serialized)
+    print("✅ Engine ready")
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a TensorRT engine for the SadTalker face renderer')
+    parser.add_argument('--size', type=int, default=256, choices=[256, 512], help='Renderer resolution')
+    parser.add_argument('--batch_size', type=int, default=8, help='Largest renderer batch')
+    parser.add_argument('--int8', action='store_true', help='Calibrate and build an INT8 engine')
+    parser.add_argument('--calib_audio', default=os.path.join(SADTALKER_DIR, "examples", "driven_audio", "bus_chinese.wav"),
+                        help='Audio driving the calibration run')
+    parser.add_argument('--calib_image', default=os.path.join(SADTALKER_DIR, "examples", "source_image", "art_3.png"),
+                        help='Source image for the calibration run')
+    parser.add_argument('--calib_frames', type=int, default=128, help='Frames used for INT8 calibration')
+    args = parser.parse_args()
+
+    os.makedirs(TRT_DIR, exist_ok=True)
+    onnx_path = os.path.join(TRT_DIR, f"face_render_{args.size}.onnx")
+
+    runner = load_runner(args.size, args.batch_size)
+    export_onnx(runner, args.size, args.batch_size, onnx_path)
+
+    if args.int8:
+        engine_path = os.path.join(TRT_DIR, f"face_render_{args.size}_int8.engine")
+        cache_path = os.path.join(TRT_DIR, f"face_render_{args.size}.calib")
+        # A saved calibration cache replaces the calibration run
+        batches = [] if os.path.exists(cache_path) else collect_calibration(
+            runner, args.calib_audio, args.calib_image, args.calib_frames
+        )
+        build_int8_engine(onnx_path, engine_path, args.size, args.batch_size,
+                          make_calibrator(batches, cache_path))
+    else:
+        engine_path = os.path.join(TRT_DIR, f"face_render_{args.size}.engine")
+        build_engine(onnx_path, engine_path, args.size, args.batch_size)
+
+if __name__ == "__main__":
+    main()
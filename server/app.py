@@ -15,36 +15,60 @@ app = FastAPI()
 class InputText(BaseModel):
     text: str
 
-# Store active WebSocket connections
-active_connections = []
+# Active WebSocket connections, each with a FIFO of unsent status messages
+active_connections = {}
+
+# Minimum gap between frames sent to one client (20 Hz)
+SEND_INTERVAL = 0.05
+
+# Unsent messages kept per client; stage messages are all delivered, only a stalled client loses the oldest
+MAX_PENDING = 32
+
+async def _sender(websocket: WebSocket, queue: asyncio.Queue):
+    """Send a client its queued statuses in order, at most one every SEND_INTERVAL seconds"""
+    try:
+        while True:
+            message = await queue.get()
+            await websocket.send_text(message)
+            await asyncio.sleep(SEND_INTERVAL)
+    except Exception:
+        active_connections.pop(websocket, None)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    active_connections.append(websocket)
+    queue = asyncio.Queue(maxsize=MAX_PENDING)
+    active_connections[websocket] = queue
+    sender = asyncio.create_task(_sender(websocket, queue))
     try:
         while True:
             await websocket.receive_text()
-    except:
-        active_connections.remove(websocket)
+    except Exception:
+        pass
+    finally:
+        # O(1) removal however the connection ends
+        active_connections.pop(websocket, None)
+        sender.cancel()
 
 async def send_progress(message: str):
-    """Send progress updates to all connected WebSocket clients"""
-    for connection in active_connections[:]:  # Copy list to avoid modification during iteration
-        try:
-            await connection.send_text(json.dumps({"status": message}))
-        except:
-            active_connections.remove(connection)
+    """Queue a progress update for all connected WebSocket clients without waiting on them"""
+    payload = json.dumps({"status": message})
+    for queue in list(active_connections.values()):
+        # Every stage message is kept in order; only a client that stopped reading drops its oldest one
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(payload)
 
 @app.post("/generate-video")
 async def generate_avatar(input: InputText):
     await send_progress("Starting audio generation...")
-    audio_path = pipeline.generate_voice(input.text)
+    # The pipeline blocks, so run it in a thread and let the senders deliver updates meanwhile
+    audio_path = await asyncio.to_thread(pipeline.generate_voice, input.text)
     
     await send_progress("Audio generated! Starting video generation...")
     await send_progress("This may take 5-10 minutes. Please wait...")
     
-    video_path = pipeline.generate_video()
+    video_path = await asyncio.to_thread(pipeline.generate_video)
     
     await send_progress("Video generation complete!")
     return {"audio_path": audio_path, "video_path": video_path}
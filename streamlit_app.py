@@ -4,24 +4,69 @@ Streamlit Web App: AI Talking Avatar Generator
 Upload a photo and enter text to generate a talking avatar using ultra-optimized SadTalker pipeline
 """
 
+import os
+
+# Must run before the pipeline import below pulls torch in
+from app._sadtalker_core import configure_cuda_allocator
+configure_cuda_allocator()
+
 import streamlit as st
 import asyncio
-import os
 import sys
 import time
+import hashlib
+import io
 import tempfile
+import threading
 import shutil
 from PIL import Image
-import base64
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # Add app directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
 
 # Import our ultra-optimized pipeline
-from ultra_optimized_pipeline import UltraOptimizedPipeline, ProgressTracker, generate_ultra_fast_avatar
+from ultra_optimized_pipeline import UltraOptimizedPipeline, ProgressTracker
+
+@st.cache_data
+def detect_device():
+    """Probe the accelerator once per server process instead of on every rerun"""
+    import torch
+    if torch.cuda.is_available():
+        # TF32 tensor-core matmuls and cuDNN autotuning for the fixed render shapes
+        torch.set_float32_matmul_precision('high')
+        torch.backends.cudnn.benchmark = True
+        return "cuda"
+    if hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+@st.cache_resource
+def get_upload_dir():
+    """Process-wide directory for uploaded photos, on tmpfs when available"""
+    shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    return tempfile.mkdtemp(prefix="avatar_uploads_", dir=shm)
+
+@st.cache_resource
+def get_loop():
+    """One event loop per server process, running in a background thread"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="avatar-event-loop", daemon=True).start()
+    return loop
+
+def run_async(coro):
+    """Run a coroutine on the shared loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+@st.cache_resource(show_spinner="🔥 Loading and warming up SadTalker models...")
+def get_pipeline():
+    """Load the pipeline once per server process and prime its kernels"""
+    pipeline = UltraOptimizedPipeline()
+    run_async(pipeline.warmup())
+    return pipeline
 
 # Custom CSS for better styling
-st.markdown("""
+CSS = """
 <style>
     .main-header {
         text-align: center;
@@ -66,33 +111,58 @@ st.markdown("""
         background-color: #fff0f0;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-def get_video_base64(video_path):
-    """Convert video to base64 for embedding"""
-    try:
-        with open(video_path, "rb") as video_file:
-            video_bytes = video_file.read()
-            video_base64 = base64.b64encode(video_bytes).decode()
-            return video_base64
-    except Exception as e:
-        st.error(f"Error loading video: {e}")
-        return None
+# Longest side of a saved upload
+MAX_UPLOAD_SIZE = 512
+
+# Saved uploads kept in the (RAM-backed) upload dir; least recently used ones are evicted
+MAX_SAVED_UPLOADS = 32
+
+def evict_old_uploads(save_dir, keep=MAX_SAVED_UPLOADS):
+    """Delete the least recently used uploads beyond keep, so tmpfs usage stays bounded"""
+    with os.scandir(save_dir) as it:
+        entries = [entry for entry in it if entry.is_file()]
+    if len(entries) <= keep:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - keep]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
 
 def save_uploaded_image(uploaded_file, save_dir):
-    """Save uploaded image to SadTalker source images directory"""
+    """Save uploaded image to save_dir, once per distinct upload"""
     try:
-        # Create filename
-        filename = f"uploaded_{int(time.time())}.png"
+        # Name by content so resubmitting the same photo reuses the saved image
+        # (and the runner's 3DMM cache, which is keyed on the file contents)
+        data = uploaded_file.getvalue()
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        extension = ".jpg" if uploaded_file.type == "image/jpeg" else ".png"
+        filename = f"uploaded_{digest}{extension}"
         save_path = os.path.join(save_dir, filename)
+        if os.path.exists(save_path):
+            # Mark as recently used so eviction keeps it
+            os.utime(save_path)
+            return save_path, filename
         
-        # Save image
-        image = Image.open(uploaded_file)
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
+        # Save image (opening only parses the header)
+        image = Image.open(io.BytesIO(data))
+        small = max(image.size) <= MAX_UPLOAD_SIZE
+        if small and image.mode == 'RGB' and uploaded_file.type in ('image/png', 'image/jpeg'):
+            # Already an RGB PNG/JPEG: write the upload as-is instead of decoding and re-encoding it
+            with open(save_path, 'wb') as f:
+                f.write(data)
+        else:
+            # Convert to RGB if necessary
             image = image.convert('RGB')
-        image.save(save_path)
+            # The pipeline crops to 256px anyway; face detection cost scales with pixel count
+            if not small:
+                image.thumbnail((MAX_UPLOAD_SIZE, MAX_UPLOAD_SIZE), Image.LANCZOS)
+            image.save(save_path)
         
+        evict_old_uploads(save_dir)
         return save_path, filename
     except Exception as e:
         st.error(f"Error saving image: {e}")
@@ -108,12 +178,8 @@ async def generate_talking_avatar_ultra_fast(image_path, text, progress_elements
             nonlocal progress_tracker
             progress_tracker = tracker
             if progress_elements:
-                tracker.progress_bar = progress_elements['progress_bar']
-                tracker.status_text = progress_elements['status_text']
-                tracker.time_text = progress_elements['time_text']
-        
-        # Initialize ultra-optimized pipeline
-        pipeline = UltraOptimizedPipeline()
+                tracker.slot = progress_elements['slot']
+                tracker.ctx = progress_elements.get('ctx')
         
         # Use custom image if provided, otherwise fallback to default
         if image_path and os.path.exists(image_path):
@@ -123,7 +189,7 @@ async def generate_talking_avatar_ultra_fast(image_path, text, progress_elements
             print(f"   Custom image path (reference): {image_path}")
         
         # Generate avatar with progress tracking (using custom or default image)
-        result = await pipeline.generate_avatar_video(text, image_path, setup_progress)
+        result = await get_pipeline().submit(text, image_path, setup_progress)
         
         return result
         
@@ -137,6 +203,8 @@ async def generate_talking_avatar_ultra_fast(image_path, text, progress_elements
 
 def main():
     """Main Streamlit app"""
+    st.markdown(CSS, unsafe_allow_html=True)
+    
     # Header
     st.markdown('<h1 class="main-header">🎭 AI Talking Avatar Generator</h1>', unsafe_allow_html=True)
     st.markdown('<p class="sub-header">Transform any photo into a talking avatar with ultra-fast optimization!</p>', unsafe_allow_html=True)
@@ -160,14 +228,18 @@ def main():
         
         # System info
         st.subheader("🖥️ System")
-        import torch
-        if torch.cuda.is_available():
+        device = detect_device()
+        if device == "cuda":
             st.success("✅ CUDA GPU detected")
-        elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
+        elif device == "mps":
             st.success("✅ Apple MPS detected")
         else:
             st.warning("⚠️ CPU mode (slower)")
     
+    # Models load and warm up on the first page view (after detect_device set the cuDNN flags),
+    # not on the first Generate click
+    get_pipeline()
+    
     # Main content
     col1, col2 = st.columns([1, 1])
     
@@ -204,31 +276,21 @@ def main():
     if uploaded_file and text_input.strip():
         if st.button("🚀 Generate Ultra-Fast Talking Avatar", type="primary", use_container_width=True):
             # Save uploaded image
-            sadtalker_images_dir = os.path.join(os.path.dirname(__file__), "SadTalker", "examples", "source_image")
-            os.makedirs(sadtalker_images_dir, exist_ok=True)
-            
-            image_path, filename = save_uploaded_image(uploaded_file, sadtalker_images_dir)
+            # Uploads live in memory-backed temp storage rather than the SadTalker tree
+            image_path, filename = save_uploaded_image(uploaded_file, get_upload_dir())
             
             if image_path:
                 try:
                     # Setup progress UI
                     st.markdown("### 🚀 Ultra-Optimized Pipeline Progress")
                     
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    time_text = st.empty()
-                    details_text = st.empty()
-                    
-                    progress_elements = {
-                        'progress_bar': progress_bar,
-                        'status_text': status_text,
-                        'time_text': time_text,
-                        'details_text': details_text
-                    }
+                    # One placeholder holds the bar, status and timing; the pipeline writes to it
+                    # from the shared loop thread under this session's script context
+                    progress_elements = {'slot': st.empty(), 'ctx': get_script_run_ctx()}
                     
                     # Generate avatar with progress tracking
                     with st.spinner("🔄 Generating ultra-fast talking avatar..."):
-                        result = asyncio.run(generate_talking_avatar_ultra_fast(
+                        result = run_async(generate_talking_avatar_ultra_fast(
                             image_path, text_input, progress_elements
                         ))
                     
@@ -303,14 +365,6 @@ def main():
                         <p>{str(e)}</p>
                     </div>
                     ''', unsafe_allow_html=True)
-                
-                finally:
-                    # Clean up uploaded image
-                    try:
-                        if image_path and os.path.exists(image_path):
-                            os.remove(image_path)
-                    except:
-                        pass
 
     else:
         # Instructions
@@ -8,6 +8,7 @@ import asyncio
 import sys
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Add app directory to path
@@ -35,9 +36,13 @@ def test_environment():
         "requirements-py311.txt"
     ]
     
+    # Stat all files in parallel; on network filesystems each check is a round trip
+    with ThreadPoolExecutor(max_workers=len(essential_files)) as pool:
+        exists = list(pool.map(os.path.exists, essential_files))
+    
     missing_files = []
-    for file_path in essential_files:
-        if not os.path.exists(file_path):
+    for file_path, found in zip(essential_files, exists):
+        if not found:
             missing_files.append(file_path)
             print(f"   ❌ Missing: {file_path}")
         else:
@@ -71,7 +76,7 @@ def test_audio_generation():
         
         # Run audio generation as subprocess (same as pipeline does)
         command = [
-            "python", "app/generate_audio_gtts.py",
+            sys.executable, "app/generate_audio_gtts.py",
             "--text", test_text,
             "--output", audio_path
         ]
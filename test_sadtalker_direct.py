@@ -3,10 +3,44 @@
 Direct SadTalker Test - Debug the exact failure point
 """
 
-import subprocess
+import importlib
 import os
 import sys
-import time
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+SADTALKER_DIR = os.path.join(PROJECT_ROOT, "SadTalker")
+
+from app.timing import timed
+
+# SadTalker renders 25 video frames per second of audio
+FPS = 25
+
+# Resident runner, built on first use
+_RUNNER = None
+
+def load_sadtalker_once(batch_size: int = 8):
+    """
+    Load CropAndExtract, Audio2Coeff and AnimateFromCoeff once and keep them resident
+    
+    batch_size only applies to the first call: it fixes the compiled renderer's static
+    shape, so later clips reuse it (SadTalker pads a short final batch).
+    """
+    global _RUNNER
+    if _RUNNER is None:
+        sys.path.insert(0, PROJECT_ROOT)
+        from app.sadtalker_runner import SadTalkerRunner
+        import torch
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        _RUNNER = SadTalkerRunner(SADTALKER_DIR, device=device, size=256, preprocess="crop", batch_size=batch_size)
+    return _RUNNER
+
+def render_batch_size(audio_path: str, max_batch: int = 16) -> int:
+    """Frames per renderer step: up to max_batch, but no more than the clip has"""
+    from pydub import AudioSegment
+
+    num_frames = max(1, int(len(AudioSegment.from_file(audio_path)) / 1000 * FPS))
+    return min(max_batch, num_frames)
 
 def test_sadtalker_direct():
     """Test SadTalker command directly to capture exact error"""
@@ -14,8 +48,8 @@ def test_sadtalker_direct():
     print("=" * 50)
     
     # Setup paths
-    project_root = os.path.dirname(os.path.abspath(__file__))
-    sadtalker_dir = os.path.join(project_root, "SadTalker")
+    project_root = PROJECT_ROOT
+    sadtalker_dir = SADTALKER_DIR
     audio_dir = os.path.join(project_root, "app", "audio")
     
     print(f"Project root: {project_root}")
@@ -35,129 +69,73 @@ def test_sadtalker_direct():
     default_image = os.path.join(sadtalker_dir, "examples", "source_image", "art_3.png")
     print(f"Default image exists: {os.path.exists(default_image)}")
     
-    # Find latest audio file
-    audio_files = []
+    # Find latest audio file (the pipelines now write 16 kHz WAV; older runs left MP3)
+    # (one directory read; DirEntry.stat() reuses what the scan already fetched where it can)
+    latest_audio = None
     if os.path.exists(audio_dir):
-        for file in os.listdir(audio_dir):
-            if file.endswith('.mp3'):
-                audio_files.append(os.path.join(audio_dir, file))
+        with os.scandir(audio_dir) as it:
+            latest = max((entry for entry in it if entry.name.endswith(('.wav', '.mp3'))),
+                         key=lambda entry: entry.stat().st_ctime_ns, default=None)
+        latest_audio = latest.path if latest else None
     
-    if not audio_files:
+    if latest_audio is None:
         print("❌ No audio files found")
         return
     
-    latest_audio = max(audio_files, key=os.path.getctime)
     audio_rel_path = os.path.relpath(latest_audio, sadtalker_dir)
     
     print(f"\nUsing audio: {latest_audio}")
     print(f"Relative path: {audio_rel_path}")
     print(f"Audio exists: {os.path.exists(latest_audio)}")
     
-    # Prepare command
-    command = [
-        "python", "inference.py",
-        "--driven_audio", audio_rel_path,
-        "--source_image", "examples/source_image/art_3.png",
-        "--result_dir", "../app/video",
-        "--still",
-        "--preprocess", "crop",
-        "--size", "256",  # Use available 256px model instead of missing 128px
-        "--batch_size", "1"
-    ]
-    
-    print(f"\nCommand: {' '.join(command)}")
-    print(f"Working directory: {sadtalker_dir}")
-    
-    # Test Python environment in SadTalker directory
+    # Python environment: the interpreter running this test is the one SadTalker runs in
     print(f"\n🐍 Testing Python environment...")
-    try:
-        env_test = subprocess.run(
-            ["python", "--version"],
-            cwd=sadtalker_dir,
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        print(f"Python version: {env_test.stdout.strip()}")
-        print(f"Python stderr: {env_test.stderr.strip()}")
-    except Exception as e:
-        print(f"Python test failed: {e}")
+    print(f"Python version: Python {sys.version.split()[0]}")
+    print(f"Python executable: {sys.executable}")
     
-    # Test imports
+    # Test imports in-process (SadTalker's src package resolves from its checkout, as in the runner)
     print(f"\n📦 Testing key imports...")
+    if SADTALKER_DIR not in sys.path:
+        sys.path.insert(0, SADTALKER_DIR)
     test_imports = [
-        "import torch; print(f'PyTorch: {torch.__version__}')",
-        "import numpy; print(f'NumPy: {numpy.__version__}')",
-        "from src.utils.preprocess import CropAndExtract; print('CropAndExtract: OK')",
-        "from src.test_audio2coeff import Audio2Coeff; print('Audio2Coeff: OK')"
+        ("torch", None),
+        ("numpy", None),
+        ("src.utils.preprocess", "CropAndExtract"),
+        ("src.test_audio2coeff", "Audio2Coeff"),
     ]
     
-    for test_cmd in test_imports:
+    for module_name, attr in test_imports:
         try:
-            result = subprocess.run(
-                ["python", "-c", test_cmd],
-                cwd=sadtalker_dir,
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            if result.returncode == 0:
-                print(f"✅ {result.stdout.strip()}")
+            module = importlib.import_module(module_name)
+            if attr:
+                getattr(module, attr)
+                print(f"✅ {attr}: OK")
             else:
-                print(f"❌ Import failed: {result.stderr.strip()}")
+                print(f"✅ {module_name}: {module.__version__}")
         except Exception as e:
-            print(f"❌ Import test failed: {e}")
+            print(f"❌ Import failed ({module_name}): {e}")
     
-    # Run the actual SadTalker command
-    print(f"\n🎬 Running SadTalker command...")
+    # Run SadTalker in-process; models load once, later runs reuse them (and the cached 3DMM fit)
+    print(f"\n🎬 Running SadTalker in-process...")
     try:
-        start_time = time.time()
+        with timed() as load:
+            runner = load_sadtalker_once(render_batch_size(latest_audio))
+        print(f"Model load: {load.wall:.2f}s")
+        print(f"Renderer batch size: {runner.batch_size}")
         
-        process = subprocess.Popen(
-            command,
-            cwd=sadtalker_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
+        # Warm run on silence so the timed run below excludes first-call CUDA costs
+        runner.warmup_full(default_image)
         
-        print(f"Process started with PID: {process.pid}")
+        with timed() as run_timing:
+            video_path = runner.run(latest_audio, default_image, os.path.join(project_root, "app", "video"), still=True)
         
-        # Wait for completion with timeout
-        try:
-            stdout, stderr = process.communicate(timeout=30)
-            elapsed = time.time() - start_time
-            
-            print(f"\n📊 Results:")
-            print(f"Return code: {process.returncode}")
-            print(f"Elapsed time: {elapsed:.2f}s")
-            print(f"STDOUT length: {len(stdout)} chars")
-            print(f"STDERR length: {len(stderr)} chars")
-            
-            if stdout:
-                print(f"\n📤 STDOUT:")
-                print(stdout[:1000] + ("..." if len(stdout) > 1000 else ""))
-            
-            if stderr:
-                print(f"\n📤 STDERR:")
-                print(stderr[:1000] + ("..." if len(stderr) > 1000 else ""))
-            
-            if process.returncode == 0:
-                print("✅ SadTalker completed successfully!")
-            else:
-                print(f"❌ SadTalker failed with return code {process.returncode}")
-                
-        except subprocess.TimeoutExpired:
-            print("⏰ Process timed out after 30 seconds")
-            process.kill()
-            stdout, stderr = process.communicate()
-            if stderr:
-                print(f"Timeout STDERR: {stderr}")
+        print(f"\n📊 Results:")
+        print(f"Video: {video_path}")
+        print(f"Elapsed time: {run_timing.summary()}")
+        print("✅ SadTalker completed successfully!")
     
     except Exception as e:
-        print(f"❌ Failed to start process: {e}")
+        print(f"❌ SadTalker failed: {e}")
 
 if __name__ == "__main__":
     test_sadtalker_direct()